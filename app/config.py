@@ -8,20 +8,126 @@ load_dotenv(override=True)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Temporary and output directories
-BASE_TEMP_DIR = os.path.join(BASE_DIR, "temp")
+BASE_TEMP_DIR = os.getenv("TEMP_DIR", os.path.join(BASE_DIR, "temp"))
 LOGO_DIR = os.path.join(BASE_TEMP_DIR, "logo")
 PRODUCT_DIR = os.path.join(BASE_TEMP_DIR, "product_images")
 CARD_DIR = os.path.join(BASE_TEMP_DIR, "cards")
 GENERATED_DIR = os.path.join(BASE_TEMP_DIR, "generated_campaigns")
+# Served by the app under /outputs (also home of the local storage backend)
+OUTPUTS_DIR = os.getenv("OUTPUTS_DIR", "outputs")
+
+
+
+def ensure_directories():
+    """Create the working folders; called once at app startup (writers also create theirs on demand)"""
+    for path in (BASE_TEMP_DIR, LOGO_DIR, PRODUCT_DIR, CARD_DIR, GENERATED_DIR, OUTPUTS_DIR):
+        os.makedirs(path, exist_ok=True)
 
-# Create folders if they don't exist
-os.makedirs(BASE_TEMP_DIR, exist_ok=True)
-os.makedirs(LOGO_DIR, exist_ok=True)
-os.makedirs(PRODUCT_DIR, exist_ok=True)
-os.makedirs(CARD_DIR, exist_ok=True)
-os.makedirs(GENERATED_DIR, exist_ok=True)
 
 # API keys
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Background flyer jobs (size the workers to fit the Gemini quota)
+FLYER_JOB_WORKERS = int(os.getenv("FLYER_JOB_WORKERS", "2"))
+FLYER_JOB_QUEUE_LIMIT = int(os.getenv("FLYER_JOB_QUEUE_LIMIT", "20"))
+FLYER_JOB_RETENTION = int(os.getenv("FLYER_JOB_RETENTION", "100"))
+
+# Image downloads (shared pooled session)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "16"))
+DOWNLOAD_PER_HOST_LIMIT = int(os.getenv("DOWNLOAD_PER_HOST_LIMIT", "6"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))
+DOWNLOAD_DEADLINE = float(os.getenv("DOWNLOAD_DEADLINE", "90"))
+# Input image limits: bytes per download / data URI, and pixels (decompression bombs are rejected before decoding)
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+
+# Image cache (in-memory LRU of decoded images + content-addressed disk tier)
+IMAGE_CACHE_DIR = os.path.join(BASE_TEMP_DIR, "image_cache")
+IMAGE_CACHE_MEMORY_ITEMS = int(os.getenv("IMAGE_CACHE_MEMORY_ITEMS", "256"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IMAGE_CACHE_MAX_AGE = float(os.getenv("IMAGE_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+IMAGE_CACHE_FRESH_SECONDS = float(os.getenv("IMAGE_CACHE_FRESH_SECONDS", "3600"))
+
+# Pages 2..N of a campaign are generated concurrently, capped by this many workers
+FLYER_PAGE_CONCURRENCY = int(os.getenv("FLYER_PAGE_CONCURRENCY", "4"))
+
+# Shared Gemini gateway: rate limit, concurrency and retry budget
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "10"))
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", "4"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "60"))
+
+# Model input preprocessing: longest side per role, JPEG quality, prepared-image cache size
+PREPROCESS_PRODUCT_MAX_SIDE = int(os.getenv("PREPROCESS_PRODUCT_MAX_SIDE", "768"))
+PREPROCESS_LOGO_MAX_SIDE = int(os.getenv("PREPROCESS_LOGO_MAX_SIDE", "512"))
+PREPROCESS_REFERENCE_MAX_SIDE = int(os.getenv("PREPROCESS_REFERENCE_MAX_SIDE", "1024"))
+PREPROCESS_JPEG_QUALITY = int(os.getenv("PREPROCESS_JPEG_QUALITY", "85"))
+PREPROCESS_CACHE_ITEMS = int(os.getenv("PREPROCESS_CACHE_ITEMS", "512"))
+
+# Image model used for every flyer / product generation call
+GEMINI_IMAGE_MODEL = os.getenv("GEMINI_IMAGE_MODEL", "gemini-2.5-flash-image-preview")
+
+# Generated page cache (keyed on model, prompt and input digests)
+RESULT_CACHE_DIR = os.path.join(BASE_TEMP_DIR, "result_cache")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Also write generated pages to outputs/ (they normally stay in memory until upload)
+SAVE_GENERATED_PAGES = os.getenv("SAVE_GENERATED_PAGES", "false").lower() in ("1", "true", "yes")
+
+# PDF assembly: pages are embedded as JPEG at this quality and resolution
+PDF_JPEG_QUALITY = int(os.getenv("PDF_JPEG_QUALITY", "85"))
+PDF_DPI = int(os.getenv("PDF_DPI", "150"))
+
+# Uploads: concurrent transfers (and pooled connections), retry budget and per-request timeout (seconds)
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "6"))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "120"))
+
+# Batch campaigns: page generations of all campaigns share this many round-robin workers
+BATCH_PAGE_CONCURRENCY = int(os.getenv("BATCH_PAGE_CONCURRENCY", "4"))
+BATCH_MAX_CAMPAIGNS = int(os.getenv("BATCH_MAX_CAMPAIGNS", "32"))
+# Campaigns accepted in one batch request, and queued/running batch campaigns before 503
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "50"))
+BATCH_QUEUE_LIMIT = int(os.getenv("BATCH_QUEUE_LIMIT", "200"))
+
+# Where pages and PDFs are published: "cloudinary", "local" (OUTPUTS_DIR, served under /outputs) or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary").lower()
+STORAGE_PUBLIC_BASE_URL = os.getenv("STORAGE_PUBLIC_BASE_URL", "http://localhost:8000/outputs")
+
+# Create shared clients and open connection pools in the background at startup
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Synthesized product photos (by product name), also used when a product image_url cannot be downloaded
+SYNTHESIZED_PRODUCT_DIR = os.path.join(BASE_TEMP_DIR, "synthesized_products")
+PRODUCT_IMAGE_CONCURRENCY = int(os.getenv("PRODUCT_IMAGE_CONCURRENCY", "4"))
+# Most names in one /product-images request (each uncached one is a Gemini call)
+PRODUCT_IMAGE_MAX_NAMES = int(os.getenv("PRODUCT_IMAGE_MAX_NAMES", "50"))
+PRODUCT_IMAGE_FALLBACK = os.getenv("PRODUCT_IMAGE_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+# Page rendering: "ai" (every page generated) or "composite" (one AI background, cards drawn with PIL)
+FLYER_RENDER_MODE = os.getenv("FLYER_RENDER_MODE", "ai").lower()
+COMPOSITE_FONT = os.getenv("COMPOSITE_FONT", "DejaVuSans.ttf")
+COMPOSITE_BOLD_FONT = os.getenv("COMPOSITE_BOLD_FONT", "DejaVuSans-Bold.ttf")
+
+# Reusable theme backgrounds / reference pages (keyed by theme, campaign and branding)
+STYLE_LIBRARY_DIR = os.path.join(BASE_TEMP_DIR, "style_library")
+STYLE_LIBRARY_MAX_ENTRIES = int(os.getenv("STYLE_LIBRARY_MAX_ENTRIES", "200"))
+STYLE_LIBRARY_MAX_AGE = float(os.getenv("STYLE_LIBRARY_MAX_AGE", str(30 * 24 * 3600)))
+
+# Seconds a finished /generate-flyers response answers identical requests (in-flight duplicates always share)
+CAMPAIGN_RESULT_TTL = float(os.getenv("CAMPAIGN_RESULT_TTL", "120"))
+
+# Worker processes for CPU-bound image work (page conversion, compositing, re-encoding); 0 runs it in the calling thread
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Content-addressed local image assets (logos, product photos, synthesized products)
+ASSET_STORE_DIR = os.path.join(BASE_TEMP_DIR, "assets")
+ASSET_STORE_MAX_BYTES = int(os.getenv("ASSET_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
 
+# Working files: per-job scratch folders (GENERATED_DIR) and leftovers in OUTPUTS_DIR (published/ excluded) are swept
+# every JANITOR_INTERVAL seconds (0 disables) once older than ARTIFACT_MAX_AGE, oldest first past ARTIFACT_MAX_BYTES
+ARTIFACT_MAX_AGE = float(os.getenv("ARTIFACT_MAX_AGE", str(6 * 3600)))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "600"))
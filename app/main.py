@@ -1,20 +1,45 @@
-import os
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from app.routes.flyer import router as flyer_router
 from app.logger_config import setup_logging
+from app.config import OUTPUTS_DIR, STARTUP_WARMUP, ensure_directories
+from app.services.clients import warm_up
+from app.services.image_cache import image_cache
+from app.services.image_workers import image_workers
+from app.services.workspace import workspace
+from app.services import metrics
 setup_logging()
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the worker accepts requests right away
+    if STARTUP_WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    # Sweeps scratch folders and outputs/ leftovers (including those of a previous crash) on an interval
+    workspace.start_janitor()
+    yield
+    workspace.stop_janitor()
+    image_cache.flush()
+    image_workers.shutdown()
 
-OUTPUTS_DIR = "outputs"
-os.makedirs(OUTPUTS_DIR, exist_ok=True)
+
+app = FastAPI(lifespan=lifespan)
+
+ensure_directories()
 app.mount("/outputs", StaticFiles(directory=OUTPUTS_DIR), name="outputs")
 
 
 app.include_router(flyer_router, prefix="/api", tags=["Flyer"])
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint: stage timings, retries, cache hits, failures, work in flight"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Template Generate API!"}
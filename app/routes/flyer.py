@@ -1,17 +1,47 @@
-from fastapi import APIRouter, HTTPException
-import math
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import time
 import os
-from PIL import Image
+import itertools
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
-import uuid
 
-from app.schemas.Campaign_Info import FlyerRequest, FlyerResponse
-from app.services.flyer_service import generate_flyer, download_image, format_products_info
-from app.services.upload import upload_image
+from app.schemas.Campaign_Info import BatchFlyerRequest, BatchStatus, FlyerRequest, FlyerResponse, JobStatus, PaginationPlan, Product, ProductImage, ProductImageRequest, ProductImageResponse
+from app.services.job_manager import job_manager
+from app.services.batch_runner import batch_runner
+from app.services.image_cache import image_cache
+from app.services.gemini_gateway import gemini
+from app.services.image_preprocess import PreparedImage, prepare_encoded
+from app.services.result_cache import result_cache
+from app.services.artifacts import FlyerArtifact
+from app.services.flyer_service import generate_flyer, download_images, format_products_info
+from app.services.upload import discard_uploads, upload_image_async, upload_pdf, upload_pdf_async
+from app.services.pdf_writer import StreamingPdfWriter
+from app.services.metrics import register_stats, track
+from app.services.single_flight import SingleFlight
+from app.services.compositor import generate_background, render_page
+from app.services.style_library import style_library
+from app.services.product_name_image import normalize_product_name, product_images
+from app.services.workspace import workspace
+from app.services.pagination import get_optimal_grid_layout, paginate
+from app.config import CAMPAIGN_RESULT_TTL, FLYER_PAGE_CONCURRENCY, FLYER_RENDER_MODE, PRODUCT_IMAGE_FALLBACK
 
 
 logger = logging.getLogger(__name__)
 
+# How often a progress stream with no new events checks whether its client is still connected
+_DISCONNECT_POLL_SECONDS = 1.0
+
+# Identical campaign requests in flight share one pipeline run; responses are kept briefly for late retries
+_campaign_flights = SingleFlight("campaign", ttl=CAMPAIGN_RESULT_TTL)
+register_stats("flyer_coalesced_campaigns", _campaign_flights.stats, "Campaign requests coalesced onto an in-flight run", counters=("executed", "coalesced", "recent_hits"))
+
 FIRST_PROMPT_TEMPLATE = """
 Create a professional supermarket flyer for {supermarket_name}.
 - Theme: {theme_style}
@@ -122,166 +152,428 @@ router = APIRouter(
     tags=["Flyer"]
 )
 
-OUTPUTS_DIR = "outputs"
-
-def get_optimal_grid_layout(product_count: int) -> str:
-    """Determine optimal grid layout based on product count"""
-    if product_count == 1:
-        return "1x1 (single large product)"
-    elif product_count == 2:
-        return "1x2 or 2x1 (two products side by side )"
-    elif product_count == 3:
-        return "1x3 or 3x1 (three products in a row )"
-    elif product_count == 4:
-        return "2x2 (four products in a square grid)"
-    elif product_count == 5:
-        return "flexible 2x3 or 3x2 with one larger product"
-    elif product_count == 6:
-        return "2x3 or 3x2 (six products in rectangular grid)"
-    elif product_count <= 8:
-        return "2x4 or 4x2 (eight products maximum)"
-    else:
-        return "3x3 or flexible grid (arrange efficiently)"
-    
+# Shared by all campaigns, so it also caps concurrent Gemini page calls process-wide
+_page_executor = ThreadPoolExecutor(max_workers=FLYER_PAGE_CONCURRENCY, thread_name_prefix="flyer-page")
+
 @router.post("/generate-flyers", response_model=FlyerResponse)
 async def generate_flyers(request: FlyerRequest):
     """Generate flyers based on products with 4 products per flyer"""
-    
+    # The pipeline is blocking (HTTP, Gemini, PIL, uploads), keep it off the event loop.
+    # Retries and duplicate submissions of the same campaign share one run (and its response)
+    return await run_in_threadpool(
+        _campaign_flights.do, _campaign_key(request), build_flyers, request, share_recent=request.use_cache
+    )
+
+
+@router.post("/generate-flyers/stream")
+async def stream_flyers(request: FlyerRequest, http_request: Request, event_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$")):
+    """Generate flyers and stream progress: stage changes, each page as soon as it is
+    uploaded, then a final `completed` (or `error`) event with the PDF URL.
+
+    Events are newline-delimited JSON by default, or Server-Sent Events with ?format=sse.
+    If the client goes away, remaining pages are not generated and published ones are removed.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    started = time.monotonic()
+    cancelled = threading.Event()
+
+    def publish(event: str, **details):
+        # Called from worker threads
+        payload = {"event": event, "elapsed_seconds": round(time.monotonic() - started, 3), **details}
+        loop.call_soon_threadsafe(events.put_nowait, payload)
+
+    async def run():
+        try:
+            result = await run_in_threadpool(build_flyers, request, publish, cancelled=cancelled)
+            publish("completed", result=result.model_dump(mode="json"))
+        except HTTPException as e:
+            publish("error", detail=e.detail)
+        except Exception as e:
+            publish("error", detail=str(e))
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                try:
+                    payload = await asyncio.wait_for(events.get(), timeout=_DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await http_request.is_disconnected():
+                        logger.info("Stream client disconnected, cancelling the campaign")
+                        return
+                    continue
+                if payload is None:
+                    break
+                data = json.dumps(payload, default=str)
+                yield f"event: {payload['event']}\ndata: {data}\n\n" if event_format == "sse" else f"{data}\n"
+            await task
+        finally:
+            # Disconnected (or the response was torn down): stop the pipeline at its next page
+            if not task.done():
+                cancelled.set()
+
+    media_type = "text/event-stream" if event_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/pagination", response_model=PaginationPlan)
+async def plan_flyer_pages(request: FlyerRequest):
+    """Preview how a campaign would be paginated (pages, products and grid per page, model calls) without generating it"""
+    return _plan_pages(request)[1]
+
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_flyer_job(request: FlyerRequest):
+    """Queue a flyer campaign on the background worker pool and return its job id"""
+    job = job_manager.submit(build_flyers, request)
+    return JobStatus(**job.snapshot())
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_flyer_job(job_id: str):
+    """Report status, page progress and (once done) the FlyerResponse of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobStatus(**job.snapshot())
+
+
+@router.post("/batch", response_model=BatchStatus, status_code=202)
+async def submit_flyer_batch(request: BatchFlyerRequest):
+    """Queue many campaigns at once; their pages share one round-robin generation budget"""
+    batch = batch_runner.submit(build_flyers, request.campaigns, prefetch=_prefetch_batch_assets)
+    return BatchStatus(**batch.snapshot())
+
+
+@router.get("/batch/{batch_id}", response_model=BatchStatus)
+async def get_flyer_batch(batch_id: str):
+    """Report per-campaign status and results of a batch"""
+    batch = batch_runner.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+    return BatchStatus(**batch.snapshot())
+
+
+@router.post("/product-images", response_model=ProductImageResponse)
+async def synthesize_product_images(request: ProductImageRequest):
+    """Synthesized photos for many product names: cached ones right away, the rest generated concurrently"""
+    return await run_in_threadpool(_synthesize_product_images, request.names)
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the image download cache"""
+    return image_cache.stats()
+
+
+@router.get("/storage/usage")
+async def get_storage_usage():
+    """Disk usage of the local working files and caches, plus the artifact janitor counters"""
+    usage = await run_in_threadpool(workspace.usage)
+    return {"areas": usage, "janitor": workspace.stats()}
+
+
+@router.get("/gemini/stats")
+async def get_gemini_stats():
+    """Call, retry and throttling counters of the shared Gemini gateway"""
+    return {**gemini.stats(), "result_cache": result_cache.stats()}
+
+
+def _build_page_prompt(template: str, request: FlyerRequest, current_products: List[Product]) -> str:
+    """Fill a page prompt template for the given products"""
+    return template.format(
+        supermarket_name=request.supermarket_name,
+        theme_style=request.theme_style,
+        why_this_campaign=request.why_this_campaign,
+        supermarket_address=request.supermarket_address,
+        phone_number=request.phone_number,
+        email=request.email,
+        campaign_start_date=request.campaign_start_date,
+        campaign_end_date=request.campaign_end_date,
+        products_info=format_products_info(current_products),
+        grid_layout=get_optimal_grid_layout(len(current_products)),
+        product_count=len(current_products)
+    )
+
+
+def _generate_follow_up_page(request: FlyerRequest, page_number: int, current_products: List[Product], images: Dict[str, PreparedImage], reference_flyer: Optional[PreparedImage], progress: Optional[Callable[..., None]] = None) -> Tuple[List[FlyerArtifact], List[Future]]:
+    """Generate page 2..N - use second prompt with reference, no logo - and start its uploads"""
+    started = time.monotonic()
+    prompt = _build_page_prompt(SECOND_PROMPT_TEMPLATE, request, current_products)
+    product_images = [images[str(product.image_url)] for product in current_products]
+    flyer_images = generate_flyer(prompt, product_images, None, reference_flyer, use_cache=request.use_cache)
+    return flyer_images, _start_uploads(flyer_images, page_number, time.monotonic() - started, progress)
+
+
+def _render_composite_page(request: FlyerRequest, page_number: int, current_products: List[Product], images: Dict[str, PreparedImage], background: FlyerArtifact, progress: Optional[Callable[..., None]] = None) -> Tuple[List[FlyerArtifact], List[Future]]:
+    """Lay out a page locally on the campaign background (no model call) and start its upload"""
+    started = time.monotonic()
+    flyer_images = [render_page(background, current_products, images, get_optimal_grid_layout(len(current_products)), page_number)]
+    return flyer_images, _start_uploads(flyer_images, page_number, time.monotonic() - started, progress)
+
+
+def _start_uploads(flyer_images: List[FlyerArtifact], page_number: int, generation_seconds: float, progress: Optional[Callable[..., None]] = None) -> List[Future]:
+    """Hand the encoded bytes straight to the upload pool and report each page once it is online"""
+    uploads = []
+    for image_index, artifact in enumerate(flyer_images):
+        upload = upload_image_async(artifact.data)
+        if progress is not None:
+            upload.add_done_callback(_page_ready_reporter(progress, page_number, image_index, generation_seconds, time.monotonic()))
+        uploads.append(upload)
+    return uploads
+
+
+def _page_ready_reporter(progress: Callable[..., None], page_number: int, image_index: int, generation_seconds: float, upload_started: float):
+    def report(upload: Future):
+        if upload.exception() is None:
+            _report(
+                progress,
+                "page_ready",
+                page=page_number,
+                image_index=image_index,
+                url=upload.result(),
+                generation_seconds=round(generation_seconds, 3),
+                upload_seconds=round(time.monotonic() - upload_started, 3),
+            )
+    return report
+
+
+def _synthesize_product_images(names: List[str]) -> ProductImageResponse:
+    spellings: Dict[str, List[str]] = {}
+    for name in names:
+        spellings.setdefault(normalize_product_name(name), []).append(name)
+    spellings.pop("", None)
+
+    try:
+        entries = product_images.generate_many(list(spellings))
+    except Exception as e:
+        logger.error(f"Product image synthesis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to synthesize product images: {str(e)}")
+
+    return ProductImageResponse(images=[
+        ProductImage(name=key, requested_as=spellings[key], url=product_images.publish(entry), cached=entry["cached"])
+        for key, entry in entries.items()
+    ])
+
+
+def _fallback_product_images(request: FlyerRequest, errors: Dict[str, HTTPException]) -> Dict[str, bytes]:
+    """Stand in synthesized photos for product images that failed to download (the logo has no substitute)"""
+    logo_url = str(request.supermarket_logo_url)
+    if logo_url in errors:
+        raise errors[logo_url]
+
+    names: Dict[str, str] = {}
+    for product in request.products:
+        if str(product.image_url) in errors:
+            names.setdefault(str(product.image_url), product.name)
+    logger.warning(f"{len(names)} product image(s) could not be downloaded, synthesizing: {list(names.values())}")
+
     try:
-        # Download logo image
-        logo_image = download_image(request.supermarket_logo_url)
+        entries = product_images.generate_many(list(names.values()))
+    except Exception as e:
+        logger.error(f"Product image fallback failed: {str(e)}")
+        raise next(iter(errors.values()))
+    return {url: product_images.read_bytes(entries[normalize_product_name(name)]) for url, name in names.items()}
+
+
+def _prefetch_batch_assets(campaigns: List[FlyerRequest]):
+    """Download every distinct logo and product image of a batch once, warming the image cache"""
+    urls = []
+    for campaign in campaigns:
+        urls.append(campaign.supermarket_logo_url)
+        urls.extend(product.image_url for product in campaign.products)
+    download_images(urls)
+
+
+def _campaign_key(request: FlyerRequest) -> str:
+    """Canonical identity of a campaign request (field order and URL spelling normalized by the schema)"""
+    canonical = json.dumps(request.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _plan_pages(request: FlyerRequest) -> Tuple[List[List[Product]], PaginationPlan]:
+    composite = (request.render_mode or FLYER_RENDER_MODE) == "composite"
+    return paginate(
+        request.products, request.products_per_page, request.pagination, request.group_by,
+        model_calls=1 if composite else None,
+    )
+
+
+class CampaignCancelled(Exception):
+    """The client of a campaign went away before it finished"""
+
+
+def _check_cancelled(cancelled: Optional[threading.Event]):
+    if cancelled is not None and cancelled.is_set():
+        raise CampaignCancelled("Campaign cancelled: the client disconnected")
+
+
+def _unless_cancelled(cancelled: Optional[threading.Event], fn: Callable) -> Callable:
+    """fn, failing fast instead once the campaign is cancelled (for pages still waiting for a worker)"""
+    def run(*args, **kwargs):
+        _check_cancelled(cancelled)
+        return fn(*args, **kwargs)
+    return run
+
+
+def _report(progress: Optional[Callable[..., None]], stage: str, **details):
+    if progress is not None:
+        progress(stage, **details)
+
+
+@track("campaign", in_flight="campaigns")
+def build_flyers(request: FlyerRequest, progress: Optional[Callable[..., None]] = None, page_executor=None, cancelled: Optional[threading.Event] = None) -> FlyerResponse:
+    """Run the whole flyer pipeline synchronously, reporting progress through the callback.
+
+    Page generations run on page_executor (the shared page pool by default; batches
+    pass their campaign's fair-scheduler lane). Once `cancelled` is set, no further page
+    is generated and the campaign fails (taking down what it already published).
+    """
+    page_executor = page_executor or _page_executor
+    # Pages are published while later ones are still generated; if the campaign fails they are taken down again
+    image_uploads: List[Future] = []
+    page_futures: List[Future] = []
+    pdf_upload: Optional[Future] = None
+    try:
+        _report(progress, "downloading")
+        # Download the logo and every product image for the campaign up front, in parallel
+        download_errors = {} if PRODUCT_IMAGE_FALLBACK else None
+        images = download_images(
+            [request.supermarket_logo_url] + [product.image_url for product in request.products],
+            errors=download_errors,
+        )
+        if download_errors:
+            images.update(_fallback_product_images(request, download_errors))
         
-        # Calculate number of flyers needed
-        total_products = len(request.products)
-        num_flyers = math.ceil(total_products / request.products_per_page)
+        # Decode, downscale and re-encode every model input once for the whole campaign, in the image workers
+        _report(progress, "preprocessing")
+        logo_image = prepare_encoded(images[str(request.supermarket_logo_url)], "logo")
+        images = {str(product.image_url): prepare_encoded(images[str(product.image_url)], "product") for product in request.products}
+        
+        # Split products into pages (as few as products_per_page allows, evenly filled unless pagination is "fixed")
+        pages, plan = _plan_pages(request)
+        num_flyers = len(pages)
+        composite = (request.render_mode or FLYER_RENDER_MODE) == "composite"
         
         generated_flyers = []
         reference_flyer = None
         
-        for flyer_index in range(num_flyers):
-            # Get products for this flyer
-            start_idx = flyer_index * request.products_per_page
-            end_idx = min(start_idx + request.products_per_page, total_products)
-            current_products = request.products[start_idx:end_idx]
-            grid_layout = get_optimal_grid_layout(len(current_products))
-
-            # Download product images
-            product_images = []
-            for product in current_products:
-                img = download_image(product.image_url)
-                product_images.append(img)
-            
-            # Format products info for prompt
-            products_info = format_products_info(current_products)
-            
-            # Choose prompt based on flyer index
-            if flyer_index == 0:
-                # First flyer - use first prompt with logo
-                prompt = FIRST_PROMPT_TEMPLATE.format(
-                    supermarket_name=request.supermarket_name,
-                    theme_style=request.theme_style,
-                    why_this_campaign=request.why_this_campaign,
-                    supermarket_address=request.supermarket_address,
-                    phone_number=request.phone_number,
-                    email=request.email,
-                    campaign_start_date=request.campaign_start_date,
-                    campaign_end_date=request.campaign_end_date,
-                    products_info=products_info,
-                    grid_layout=grid_layout,
-                    product_count=len(current_products)
+        # Pages are appended to the PDF (in order) as soon as they are ready; the job folder goes away either way
+        with workspace.job("flyer") as job_dir:
+            output_pdf = os.path.join(job_dir, "flyer.pdf")
+            with StreamingPdfWriter(output_pdf) as pdf:
+                _report(progress, "generating", pages_total=num_flyers, pages_completed=0, pagination=plan.model_dump())
+                render_follow_up, first_follow_up = _generate_follow_up_page, 2
+                style_key = style_library.key(
+                    "background" if composite else "reference",
+                    request.theme_style, request.why_this_campaign, request.supermarket_name, logo_image.source_digest,
                 )
+                if pages and request.reuse_style:
+                    # A stored style stands in for the serial first generation, all pages can start at once
+                    reference_flyer = style_library.background(style_key) if composite else style_library.reference(style_key)
+                    if reference_flyer is not None:
+                        first_follow_up = 1
+                if pages and composite:
+                    # One AI background for the whole campaign; every page is then laid out locally
+                    if reference_flyer is None:
+                        reference_flyer = page_executor.submit(
+                            generate_background, request, logo_image, use_cache=request.use_cache
+                        ).result()
+                        style_library.put(style_key, reference_flyer.data, "background", theme_style=request.theme_style)
+                    render_follow_up, first_follow_up = _render_composite_page, 1
+                elif pages and reference_flyer is None:
+                    # First flyer - use first prompt with logo, it becomes the reference for the others
+                    _check_cancelled(cancelled)
+                    started = time.monotonic()
+                    prompt = _build_page_prompt(FIRST_PROMPT_TEMPLATE, request, pages[0])
+                    product_images = [images[str(product.image_url)] for product in pages[0]]
+                    flyer_images = page_executor.submit(
+                        generate_flyer, prompt, product_images, logo_image, use_cache=request.use_cache
+                    ).result()
+                    
+                    # Keep the first generated flyer (in memory) as reference for subsequent flyers
+                    if flyer_images:
+                        reference_flyer = prepare_encoded(flyer_images[0].data, "reference")
+                        style_library.put(style_key, reference_flyer.data, "reference", theme_style=request.theme_style)
+                    
+                    generated_flyers.extend(flyer_images)
+                    image_uploads.extend(_start_uploads(flyer_images, 1, time.monotonic() - started, progress))
+                    _add_pdf_pages(pdf, flyer_images)
+                    _report(progress, "generating", pages_completed=1)
                 
-                flyer_images = generate_flyer(prompt, product_images, logo_image)
-                
-                # Save the first generated flyer as reference for subsequent flyers
-                if flyer_images:
-                    # Load the first saved image as reference
-                    first_image_path = flyer_images[0].replace("http://localhost:8000/outputs/", "")
-                    reference_flyer = Image.open(os.path.join(OUTPUTS_DIR, first_image_path))
-                
-            else:
-                # Subsequent flyers - use second prompt with reference, no logo
-                prompt = SECOND_PROMPT_TEMPLATE.format(
-                    supermarket_name=request.supermarket_name,
-                    theme_style=request.theme_style,
-                    why_this_campaign=request.why_this_campaign,
-                    supermarket_address=request.supermarket_address,
-                    phone_number=request.phone_number,
-                    email=request.email,
-                    campaign_start_date=request.campaign_start_date,
-                    campaign_end_date=request.campaign_end_date,
-                    products_info=products_info,
-                    grid_layout=grid_layout,
-                    product_count=len(current_products)
-                )
-                
-                flyer_images = generate_flyer(prompt, product_images, None, reference_flyer)
-            
-            generated_flyers.extend(flyer_images)
-        
-        ret_urls = []
-        local_img_paths = []
-        for img_url in generated_flyers:
-            img_path = img_url.replace("http://localhost:8000/outputs/", "")
-            logger.info(f"Processing image path: {img_path}")
-            img_path = os.path.join(OUTPUTS_DIR, img_path)
-            local_img_paths.append(img_path)
-            logger.info(f"Final image path: {img_path}")
-
-            img_url = upload_image(img_path)
-            ret_urls.append(img_url)
-            logger.info(f"Uploaded image URL: {img_url}")
-
-        output_pdf = f"{OUTPUTS_DIR}/{uuid.uuid4().hex}_flyer.pdf"
-        pdf_url = generate_pdf(local_img_paths, output_pdf)
-        try:
-            if os.path.exists(output_pdf):
-                os.remove(output_pdf)
-                logger.info(f"Deleted local PDF: {output_pdf}")
+                # Subsequent flyers only depend on the reference, so render them concurrently
+                _check_cancelled(cancelled)
+                render_follow_up = _unless_cancelled(cancelled, render_follow_up)
+                page_futures = [
+                    page_executor.submit(render_follow_up, request, page_number, current_products, images, reference_flyer, progress)
+                    for page_number, current_products in enumerate(pages[first_follow_up - 1:], start=first_follow_up)
+                ]
+                completed = itertools.count(first_follow_up)
+                for future in page_futures:
+                    future.add_done_callback(lambda _: _report(progress, "generating", pages_completed=next(completed)))
+                # Collect in page order for the PDF and img_urls
+                for future in page_futures:
+                    flyer_images, uploads = future.result()
+                    generated_flyers.extend(flyer_images)
+                    image_uploads.extend(uploads)
+                    _add_pdf_pages(pdf, flyer_images)
             
-            for img_path in local_img_paths:
-                if os.path.exists(img_path):
-                    os.remove(img_path)
-                    logger.info(f"Deleted local image: {img_path}")
-        except Exception as e:
-            logger.error(f"Error deleting local files: {str(e)}")
-
-
+            # Page uploads have been running alongside generation; only the PDF is left
+            _check_cancelled(cancelled)
+            _report(progress, "uploading")
+            pdf_upload = upload_pdf_async(output_pdf)
+            ret_urls = [upload.result() for upload in image_uploads]
+            logger.info(f"Uploaded image URLs: {ret_urls}")
+            pdf_url = pdf_upload.result()
 
         return FlyerResponse(
             success=True,
             message=f"Successfully generated {len(generated_flyers)} flyer(s)",
             flyers_generated=len(generated_flyers),
             pdf_url=pdf_url,
-            img_urls=ret_urls
-
+            img_urls=ret_urls,
+            pagination=plan,
         )
         
     except Exception as e:
         logger.error(f"Error in /generate-flyers: {str(e)}")
+        _discard_campaign_uploads(image_uploads, page_futures, pdf_upload)
         raise HTTPException(status_code=500, detail=str(e))
 
-from typing import List
-from app.services.upload import upload_pdf
 
-def generate_pdf(flyer_images: List[str], output_pdf: str = "outputs/final_flyer.pdf"):
-    # Merge all pages into a single PDF
+def _discard_campaign_uploads(image_uploads: List[Future], page_futures: List[Future], pdf_upload: Optional[Future]):
+    """Take down the pages (and PDF) a failed campaign already published, including those of pages still in flight"""
+    uploads = dict.fromkeys(image_uploads)
+    for future in page_futures:
+        if future.cancel() or future.exception() is not None:
+            continue
+        uploads.update(dict.fromkeys(future.result()[1]))
+    if pdf_upload is not None:
+        uploads[pdf_upload] = None
+    discard_uploads(uploads)
+
+def _add_pdf_pages(pdf: StreamingPdfWriter, flyer_images: List[FlyerArtifact]):
+    for artifact in flyer_images:
+        pdf.add_page(artifact.data)
+
+
+def generate_pdf(flyer_images: List[FlyerArtifact], output_pdf: Optional[str] = None):
+    # Merge all pages into a single PDF, one page in memory at a time (in a scratch folder unless a path is given)
     try:
-        if flyer_images:
-            pil_imgs = []
-            for f in flyer_images:
-                with Image.open(f) as img:
-                    if img.mode in ("P", "RGBA"):
-                        img = img.convert("RGB")
-                    pil_imgs.append(img.copy())
-
-            pil_imgs[0].save(output_pdf, save_all=True, append_images=pil_imgs[1:])
-            print(f"Final flyer PDF saved: {output_pdf}")
-        else:
-            print("No flyer images generated.")
-
-        # Upload PDF to Cloudinary
-        uploaded_pdf = upload_pdf(output_pdf)
+        with workspace.job("pdf") as job_dir:
+            output_pdf = output_pdf or os.path.join(job_dir, "final_flyer.pdf")
+            if flyer_images:
+                with StreamingPdfWriter(output_pdf) as pdf:
+                    _add_pdf_pages(pdf, flyer_images)
+                logger.info(f"Final flyer PDF saved: {output_pdf}")
+            else:
+                logger.warning("No flyer images generated")
+
+            # Upload PDF to storage
+            uploaded_pdf = upload_pdf(output_pdf)
 
         return uploaded_pdf
     except Exception as e:
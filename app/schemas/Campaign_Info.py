@@ -1,6 +1,9 @@
+from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field, HttpUrl
 
+from app.config import BATCH_MAX_SIZE, PRODUCT_IMAGE_MAX_NAMES
+
 
 # products_example = [
 #     {
@@ -87,6 +90,7 @@ class Product(BaseModel):
     new_price: float
     old_price: float
     secondary_name: str
+    category: Optional[str] = None  # used when pages are grouped by category
 
 class FlyerRequest(BaseModel):
     supermarket_name: str
@@ -101,10 +105,81 @@ class FlyerRequest(BaseModel):
     theme_style: str
     phone_number: Optional[str] = "01700000000"
     email: Optional[str] = "info@supermarket.com"
+    use_cache: bool = True  # set False to force fresh generations for this request
+    # "ai": every page generated by Gemini; "composite": one AI background, product cards drawn locally
+    render_mode: Optional[str] = Field(None, pattern="^(ai|composite)$")
+    reuse_style: bool = False  # start from a stored background/reference page with the same theme and branding
+    # "balanced": as few pages as products_per_page allows, evenly filled; "fixed": full pages of products_per_page, remainder last
+    pagination: str = Field("balanced", pattern="^(balanced|fixed)$")
+    group_by: Optional[str] = Field(None, pattern="^(category|price)$")  # reorder products so pages share a category / price range
+
+class PlannedPage(BaseModel):
+    page: int
+    product_count: int
+    grid_layout: str
+    products: List[str]
+
+class PaginationPlan(BaseModel):
+    strategy: str
+    group_by: Optional[str] = None
+    max_per_page: int
+    model_calls: int  # page generations before caching (composite: one background for all pages)
+    pages: List[PlannedPage]
 
 class FlyerResponse(BaseModel):
     success: bool
     message: str
     flyers_generated: int
     pdf_url: Optional[HttpUrl] = None
-    img_urls: Optional[List[HttpUrl]] = None
\ No newline at end of file
+    img_urls: Optional[List[HttpUrl]] = None
+    pagination: Optional[PaginationPlan] = None
+
+class PageReady(BaseModel):
+    page: int
+    image_index: int = 0
+    url: HttpUrl
+    generation_seconds: float
+    upload_seconds: float
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    stage: str
+    pages_total: int = 0
+    pages_completed: int = 0
+    pages: List[PageReady] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[FlyerResponse] = None
+
+
+class BatchFlyerRequest(BaseModel):
+    campaigns: List[FlyerRequest] = Field(..., min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    status: str
+    created_at: datetime
+    campaigns_total: int
+    campaigns_completed: int = 0
+    campaigns_failed: int = 0
+    campaigns: List[JobStatus] = []
+
+
+class ProductImageRequest(BaseModel):
+    names: List[str] = Field(..., min_length=1, max_length=PRODUCT_IMAGE_MAX_NAMES)
+
+
+class ProductImage(BaseModel):
+    name: str
+    requested_as: List[str] = []
+    url: Optional[HttpUrl] = None
+    cached: bool = False
+
+
+class ProductImageResponse(BaseModel):
+    images: List[ProductImage]
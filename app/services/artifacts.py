@@ -0,0 +1,45 @@
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+
+def _sniff_mime_type(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+class FlyerArtifact:
+    """A generated flyer page travelling through the pipeline in memory.
+
+    Holds the encoded bytes exactly as the model returned them, so upload and PDF
+    assembly can use them without decoding or re-encoding. Writing to disk is
+    optional (see save()).
+    """
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        self.data = data
+        self.mime_type = mime_type or _sniff_mime_type(data)
+        self.metadata = metadata or {}
+        self.path: Optional[str] = None
+        self._digest: Optional[str] = None
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.data).hexdigest()
+        return self._digest
+
+    @property
+    def extension(self) -> str:
+        return self.mime_type.split("/")[-1].replace("jpeg", "jpg")
+
+    def save(self, path: str) -> str:
+        """Write the encoded bytes to path (no re-encode) and remember where they went"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.data)
+        self.path = path
+        return path
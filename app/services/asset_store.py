@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.config import ASSET_STORE_DIR, ASSET_STORE_MAX_BYTES
+from app.services.metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Blobs used this recently are never evicted: another worker may be about to open the path it just got
+_EVICTION_GRACE_SECONDS = 600
+
+
+def _extension(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return "bin"
+
+
+class AssetStore:
+    """Content-addressed store for local image assets (logos, product photos, synthesized images).
+
+    Bytes live once under blobs/<aa>/<sha256>.<ext>, whatever namespace or name they were
+    stored under, so identical images are deduplicated and different images with the same
+    name no longer collide. Small ref files (refs/<namespace>/<hash of URL>.json) map a
+    source URL to the latest digest, so a recently fetched URL is not fetched again. Every
+    file is written to a temporary name and renamed into place, so several worker processes
+    can share the directory. Blob mtimes double as last-use times: past max_bytes (blobs and
+    refs together) the least recently used blobs are removed, along with the refs to them.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.ref_dir = os.path.join(root, "refs")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None
+        self._stats = {"stored": 0, "deduplicated": 0, "hits": 0, "misses": 0, "evicted": 0, "refs_dropped": 0}
+
+    def put(self, data: bytes, namespace: str, name: Optional[str] = None, url: Optional[str] = None) -> str:
+        """Store the bytes (once per digest), point the URL ref at them and return the blob path"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest, _extension(data))
+        if os.path.exists(path):
+            os.utime(path)
+            new_bytes = 0
+            with self._lock:
+                self._stats["deduplicated"] += 1
+        else:
+            self._write(path, data)
+            new_bytes = len(data)
+            with self._lock:
+                self._stats["stored"] += 1
+
+        if url:
+            ref = json.dumps({"digest": digest, "path": path, "name": name, "url": url, "stored_at": time.time()}).encode("utf-8")
+            self._write(self._ref_path(namespace, url), ref)
+            new_bytes += len(ref)
+
+        self._account(new_bytes)
+        return path
+
+    def lookup(self, namespace: str, url: str, max_age: Optional[float] = None) -> Optional[str]:
+        """Path of the blob last stored for this URL, if it is still there (and stored within max_age seconds)"""
+        try:
+            with open(self._ref_path(namespace, url), "r", encoding="utf-8") as f:
+                ref = json.load(f)
+            if max_age is not None and time.time() - ref["stored_at"] > max_age:
+                raise ValueError("stale ref")
+            path = ref["path"]
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return path
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "bytes": self._bytes or 0}
+
+    def _account(self, new_bytes: int):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan(self.blob_dir) + self._scan(self.ref_dir))
+            else:
+                self._bytes += new_bytes
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def _scan(directory: str) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every file under directory"""
+        entries = []
+        for folder, _, files in os.walk(directory):
+            for file in files:
+                if file.endswith(".tmp"):
+                    continue
+                path = os.path.join(folder, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        # Caller holds the lock. Rescans, so files written by other processes count too
+        blobs = self._scan(self.blob_dir)
+        refs = self._scan(self.ref_dir)
+        total = sum(size for _, size, _ in blobs + refs)
+        cutoff = time.time() - _EVICTION_GRACE_SECONDS
+        for mtime, size, path in sorted(blobs):
+            if total <= self.max_bytes or mtime > cutoff:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._stats["evicted"] += 1
+
+        # Drop refs whose blob is gone (evicted here or by another process)
+        for _, size, path in refs:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    blob_path = json.load(f)["path"]
+            except (OSError, ValueError, KeyError):
+                blob_path = None
+            if blob_path is None or not os.path.exists(blob_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self._stats["refs_dropped"] += 1
+        self._bytes = total
+        logger.info(f"Asset store at {total} bytes after eviction (quota {self.max_bytes})")
+
+    def _blob_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{extension}")
+
+    def _ref_path(self, namespace: str, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.ref_dir, namespace, f"{key}.json")
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+asset_store = AssetStore(ASSET_STORE_DIR, max_bytes=ASSET_STORE_MAX_BYTES)
+
+register_stats(
+    "flyer_asset_store", asset_store.stats, "Content-addressed local image assets",
+    counters=("stored", "deduplicated", "hits", "misses", "evicted", "refs_dropped"),
+)
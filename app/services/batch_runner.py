@@ -0,0 +1,116 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.config import BATCH_PAGE_CONCURRENCY, BATCH_MAX_CAMPAIGNS, BATCH_QUEUE_LIMIT, FLYER_JOB_RETENTION
+from app.services.fair_scheduler import FairScheduler
+from app.services.job_manager import Job
+
+logger = logging.getLogger(__name__)
+
+
+class Batch:
+    """A group of campaigns submitted together, one Job per campaign"""
+
+    def __init__(self, batch_id: str, jobs: List[Job]):
+        self.id = batch_id
+        self.jobs = jobs
+        self.created_at = datetime.now()
+
+    @property
+    def finished(self) -> bool:
+        return all(job.finished for job in self.jobs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        campaigns = [job.snapshot() for job in self.jobs]
+        completed = sum(1 for c in campaigns if c["status"] == "completed")
+        failed = sum(1 for c in campaigns if c["status"] == "failed")
+        if completed + failed == len(campaigns):
+            status = "completed"
+        elif any(c["status"] != "queued" for c in campaigns):
+            status = "running"
+        else:
+            status = "queued"
+        return {
+            "batch_id": self.id,
+            "status": status,
+            "created_at": self.created_at,
+            "campaigns_total": len(campaigns),
+            "campaigns_completed": completed,
+            "campaigns_failed": failed,
+            "campaigns": campaigns,
+        }
+
+
+class BatchRunner:
+    """Runs many campaigns at once while their page generations share one fair,
+    round-robin concurrency budget (see FairScheduler)."""
+
+    def __init__(self, page_concurrency: int, max_campaigns: int, queue_limit: int, retention: int):
+        self._page_concurrency = page_concurrency
+        self._max_campaigns = max_campaigns
+        self._queue_limit = queue_limit
+        self._retention = retention
+        self._scheduler: Optional[FairScheduler] = None
+        self._campaigns: Optional[ThreadPoolExecutor] = None
+        self._batches: "OrderedDict[str, Batch]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, run_campaign: Callable[..., Any], requests: List[Any], prefetch: Optional[Callable[[List[Any]], Any]] = None) -> Batch:
+        """Start run_campaign(request, progress=..., page_executor=...) for every request.
+
+        prefetch(requests), if given, runs first so assets shared between campaigns
+        (logos, repeated products) are downloaded once for the whole batch.
+        """
+        with self._lock:
+            pending = sum(1 for b in self._batches.values() for job in b.jobs if not job.finished)
+            if pending + len(requests) > self._queue_limit:
+                raise HTTPException(status_code=503, detail="Too many batch campaigns in progress, try again later")
+
+            batch = Batch(uuid.uuid4().hex, [Job(uuid.uuid4().hex) for _ in requests])
+            self._start()
+            self._batches[batch.id] = batch
+            finished = [batch_id for batch_id, b in self._batches.items() if b.finished]
+            while len(self._batches) > self._retention and finished:
+                self._batches.pop(finished.pop(0), None)
+
+        threading.Thread(
+            target=self._run, args=(batch, run_campaign, requests, prefetch), name=f"batch-{batch.id[:8]}", daemon=True
+        ).start()
+        logger.info(f"Queued flyer batch {batch.id} with {len(requests)} campaign(s)")
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        with self._lock:
+            return self._batches.get(batch_id)
+
+    def _start(self):
+        # Workers are only started once the first batch arrives
+        if self._scheduler is None:
+            self._scheduler = FairScheduler(self._page_concurrency, name="batch-page")
+            self._campaigns = ThreadPoolExecutor(max_workers=self._max_campaigns, thread_name_prefix="batch-campaign")
+
+    def _run(self, batch: Batch, run_campaign: Callable[..., Any], requests: List[Any], prefetch):
+        if prefetch is not None:
+            try:
+                prefetch(requests)
+            except Exception as e:
+                # Campaigns download (and report) their own failures
+                logger.warning(f"Prefetch for batch {batch.id} failed: {e}")
+
+        for job, request in zip(batch.jobs, requests):
+            self._campaigns.submit(job.run, run_campaign, request, page_executor=self._scheduler.lane(job.id))
+
+
+batch_runner = BatchRunner(
+    page_concurrency=BATCH_PAGE_CONCURRENCY,
+    max_campaigns=BATCH_MAX_CAMPAIGNS,
+    queue_limit=BATCH_QUEUE_LIMIT,
+    retention=FLYER_JOB_RETENTION,
+)
@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+from app.config import GEMINI_API_KEY, GEMINI_IMAGE_MODEL
+from app.services.http_session import get_session
+from app.services.image_workers import image_workers
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+_genai_client = None
+_genai_lock = threading.Lock()
+
+
+def genai_client():
+    """Return the process-wide Gemini client, importing the SDK on first use.
+
+    google.genai takes about half a second to import, so it stays off the
+    import path of the app and is loaded by warm_up() or the first call instead.
+    """
+    global _genai_client
+    if _genai_client is None:
+        with _genai_lock:
+            if _genai_client is None:
+                from google import genai
+                _genai_client = genai.Client(api_key=GEMINI_API_KEY)
+    return _genai_client
+
+
+def _warm_gemini():
+    from app.services.gemini_gateway import gemini
+    client = gemini.client
+    if GEMINI_API_KEY:
+        # Metadata call, no generation: opens the TLS connection the first page will reuse
+        client.models.get(model=GEMINI_IMAGE_MODEL)
+
+
+def _warm_storage():
+    get_storage().warm_up()
+
+
+_WARM_UP_STEPS = (
+    ("gemini", _warm_gemini),
+    ("http", get_session),
+    ("storage", _warm_storage),
+    ("image workers", image_workers.start),
+)
+
+
+def warm_up():
+    """Create the shared clients and open their connection pools ahead of the first request.
+
+    Failures are only logged: a cold client is slower, not broken.
+    """
+    for name, step in _WARM_UP_STEPS:
+        started = time.monotonic()
+        try:
+            step()
+            logger.info(f"Warmed up {name} in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed: {e}")
@@ -0,0 +1,193 @@
+import logging
+import math
+import re
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.config import COMPOSITE_FONT, COMPOSITE_BOLD_FONT, PDF_JPEG_QUALITY
+from app.schemas.Campaign_Info import FlyerRequest, Product
+from app.services.artifacts import FlyerArtifact
+from app.services.flyer_service import generate_flyer
+from app.services.image_preprocess import PreparedImage
+from app.services.image_workers import image_workers
+from app.services.metrics import track
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_PROMPT_TEMPLATE = """
+Create the BACKGROUND of a professional supermarket flyer page for {supermarket_name}.
+- Theme: {theme_style}
+- Campaign: {why_this_campaign}
+- Address: {supermarket_address}
+- Phone number: {phone_number}
+- Email: {email}
+- Campaign Period: {campaign_start_date} to {campaign_end_date}
+
+LAYOUT REQUIREMENTS:
+1. Portrait page. The top 20% is a themed header with the logo integrated naturally (no white box) and the campaign title.
+2. The bottom 12% is a footer with the address, phone number, email and campaign period.
+3. The area in between MUST stay free of text, products and prices: a calm, themed surface.
+   Product cards are placed on it afterwards, so keep it low-contrast and uncluttered.
+4. DO NOT draw any products, product cards, prices or discount badges.
+"""
+
+# Part of the page (fractions of width/height) left free for product cards by the background prompt
+CONTENT_BOX = (0.05, 0.22, 0.95, 0.87)
+CARD_GAP = 0.02
+
+
+@lru_cache(maxsize=64)
+def _font(bold: bool, size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype(COMPOSITE_BOLD_FONT if bold else COMPOSITE_FONT, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def grid_dimensions(grid_layout: str, product_count: int) -> Tuple[int, int]:
+    """(columns, rows) for a get_optimal_grid_layout() description such as "2x3 or 3x2 (...)".
+
+    The page is portrait, so of the offered options the one with fewer columns wins;
+    rows are added if the grid still has too few cells.
+    """
+    options = [(int(a), int(b)) for a, b in re.findall(r"(\d+)\s*x\s*(\d+)", grid_layout)]
+    if options:
+        columns = min(min(option) for option in options)
+    else:
+        columns = max(1, round(math.sqrt(product_count)))
+    columns = max(1, min(columns, product_count))
+    return columns, max(1, math.ceil(product_count / columns))
+
+
+@track("background")
+def generate_background(request: FlyerRequest, logo_image: Optional[PreparedImage], use_cache: bool = True) -> FlyerArtifact:
+    """One themed page background (header, logo and footer, empty centre) for the whole campaign"""
+    prompt = BACKGROUND_PROMPT_TEMPLATE.format(
+        supermarket_name=request.supermarket_name,
+        theme_style=request.theme_style,
+        why_this_campaign=request.why_this_campaign,
+        supermarket_address=request.supermarket_address,
+        phone_number=request.phone_number,
+        email=request.email,
+        campaign_start_date=request.campaign_start_date,
+        campaign_end_date=request.campaign_end_date,
+    )
+    artifacts = generate_flyer(prompt, [], logo_image, use_cache=use_cache)
+    if not artifacts:
+        raise RuntimeError("No background image returned by Gemini")
+    return artifacts[0]
+
+
+@track("composite_page")
+def render_page(background: FlyerArtifact, products: List[Product], images: Dict[str, PreparedImage], grid_layout: str, page_number: int = 1) -> FlyerArtifact:
+    """Lay the product cards out on the campaign background and return the page as a JPEG artifact.
+
+    The drawing runs in the image worker pool, only encoded bytes are handed over.
+    """
+    photos = [images[str(product.image_url)].data for product in products]
+    data = image_workers.run(compose_page, background.data, products, photos, grid_layout, PDF_JPEG_QUALITY)
+    return FlyerArtifact(data, metadata={"index": 0, "page": page_number, "mode": "composite"})
+
+
+def compose_page(background: bytes, products: List[Product], photos: List[bytes], grid_layout: str, jpeg_quality: int) -> bytes:
+    """Image worker task: the encoded background with product cards drawn on it, as JPEG bytes"""
+    with Image.open(BytesIO(background)) as image:
+        page = image.convert("RGBA")
+    width, height = page.size
+    left, top, right, bottom = (
+        int(CONTENT_BOX[0] * width), int(CONTENT_BOX[1] * height),
+        int(CONTENT_BOX[2] * width), int(CONTENT_BOX[3] * height),
+    )
+    columns, rows = grid_dimensions(grid_layout, len(products))
+    gap = int(CARD_GAP * width)
+    card_width = (right - left - gap * (columns - 1)) // columns
+    card_height = (bottom - top - gap * (rows - 1)) // rows
+
+    # Cards are drawn on one transparent layer and composited in a single pass
+    layer = Image.new("RGBA", page.size, (0, 0, 0, 0))
+    for i, product in enumerate(products):
+        row, column = divmod(i, columns)
+        # Centre a short last row
+        in_row = min(columns, len(products) - row * columns)
+        offset = (columns - in_row) * (card_width + gap) // 2
+        box = (
+            left + offset + column * (card_width + gap),
+            top + row * (card_height + gap),
+        )
+        with Image.open(BytesIO(photos[i])) as photo:
+            _draw_card(layer, box, (card_width, card_height), product, photo)
+
+    page = Image.alpha_composite(page, layer).convert("RGB")
+    buffer = BytesIO()
+    page.save(buffer, "JPEG", quality=jpeg_quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _draw_card(layer: Image.Image, origin: Tuple[int, int], size: Tuple[int, int], product: Product, photo: Image.Image):
+    x, y = origin
+    width, height = size
+    draw = ImageDraw.Draw(layer)
+    radius = max(4, min(width, height) // 14)
+    padding = max(4, width // 20)
+
+    # Semi-transparent card so the themed background shows through
+    draw.rounded_rectangle((x, y, x + width, y + height), radius=radius, fill=(255, 255, 255, 190), outline=(255, 255, 255, 230), width=2)
+
+    # Product photo in the upper ~58% of the card
+    photo_box = (width - 2 * padding, int(height * 0.58) - padding)
+    photo = photo.convert("RGBA")
+    photo.thumbnail(photo_box, Image.LANCZOS)
+    layer.alpha_composite(photo, (x + (width - photo.width) // 2, y + padding + (photo_box[1] - photo.height) // 2))
+
+    # Text block: name, secondary name, old (struck through) and new price
+    text_top = y + int(height * 0.58)
+    text_width = width - 2 * padding
+    name_font = _fit_font(draw, product.name, text_width, bold=True, size=max(10, height // 13))
+    draw.text((x + padding, text_top), _ellipsize(draw, product.name, name_font, text_width), font=name_font, fill=(30, 30, 30, 255))
+    line = text_top + name_font.size + padding // 3
+
+    secondary_font = _font(False, max(8, height // 20))
+    draw.text((x + padding, line), _ellipsize(draw, product.secondary_name, secondary_font, text_width), font=secondary_font, fill=(80, 80, 80, 255))
+    line += secondary_font.size + padding // 2
+
+    old_price = f"{product.old_price:.2f} {product.currency}"
+    old_font = _font(False, max(8, height // 17))
+    draw.text((x + padding, line), old_price, font=old_font, fill=(120, 120, 120, 255))
+    old_box = draw.textbbox((x + padding, line), old_price, font=old_font)
+    strike_y = (old_box[1] + old_box[3]) // 2
+    draw.line((old_box[0], strike_y, old_box[2], strike_y), fill=(200, 30, 30, 255), width=max(2, old_font.size // 10))
+    line += old_font.size + padding // 3
+
+    new_price = f"{product.new_price:.2f} {product.currency}"
+    new_font = _fit_font(draw, new_price, text_width, bold=True, size=max(10, height // 9))
+    draw.text((x + padding, line), new_price, font=new_font, fill=(200, 20, 20, 255))
+
+    # Discount badge in the top-right corner
+    if product.old_price > 0 and product.new_price < product.old_price:
+        percent = round((product.old_price - product.new_price) / product.old_price * 100)
+        diameter = max(24, min(width, height) // 4)
+        badge = (x + width - diameter - padding // 2, y + padding // 2)
+        draw.ellipse((badge[0], badge[1], badge[0] + diameter, badge[1] + diameter), fill=(220, 30, 30, 240))
+        badge_font = _fit_font(draw, f"-{percent}%", int(diameter * 0.8), bold=True, size=diameter // 3)
+        draw.text((badge[0] + diameter // 2, badge[1] + diameter // 2), f"-{percent}%", font=badge_font, fill=(255, 255, 255, 255), anchor="mm")
+
+
+def _fit_font(draw: ImageDraw.ImageDraw, text: str, max_width: int, bold: bool, size: int) -> ImageFont.ImageFont:
+    """Largest font up to `size` that fits the text in max_width (stops shrinking at 60%)"""
+    font = _font(bold, size)
+    minimum = max(8, int(size * 0.6))
+    while size > minimum and draw.textlength(text, font=font) > max_width:
+        size -= 1
+        font = _font(bold, size)
+    return font
+
+
+def _ellipsize(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont, max_width: int) -> str:
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > max_width:
+        text = text[:-1]
+    return text + "…"
@@ -0,0 +1,67 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[Future, Callable[..., Any], tuple, dict]
+
+
+class FairScheduler:
+    """Runs tasks from many campaigns on one fixed pool of workers, round-robin.
+
+    Each campaign gets its own FIFO lane; workers take the next task from the next
+    non-empty lane in turn, so a campaign with 30 pages cannot starve one with 2.
+    """
+
+    def __init__(self, max_workers: int, name: str = "fair-scheduler"):
+        self._lanes: "OrderedDict[str, Deque[Task]]" = OrderedDict()
+        self._condition = threading.Condition()
+        for i in range(max_workers):
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True).start()
+
+    def lane(self, campaign_id: str) -> "Lane":
+        return Lane(self, campaign_id)
+
+    def submit(self, campaign_id: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._condition:
+            self._lanes.setdefault(campaign_id, deque()).append((future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def _next_task(self) -> Task:
+        with self._condition:
+            while not self._lanes:
+                self._condition.wait()
+            # Take from the lane at the front, then move that lane to the back
+            campaign_id, tasks = next(iter(self._lanes.items()))
+            task = tasks.popleft()
+            if tasks:
+                self._lanes.move_to_end(campaign_id)
+            else:
+                del self._lanes[campaign_id]
+            return task
+
+    def _work(self):
+        while True:
+            future, fn, args, kwargs = self._next_task()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class Lane:
+    """Executor-like view of one campaign's lane (only submit() is supported)"""
+
+    def __init__(self, scheduler: FairScheduler, campaign_id: str):
+        self._scheduler = scheduler
+        self.campaign_id = campaign_id
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        return self._scheduler.submit(self.campaign_id, fn, *args, **kwargs)
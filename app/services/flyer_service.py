@@ -1,56 +1,71 @@
 from fastapi import  HTTPException
-from typing import List, Optional
-from google import genai
-from PIL import Image
-from io import BytesIO
+from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor, wait
 import requests
 import os
-from dotenv import load_dotenv
 import uuid
 from datetime import datetime
 import logging
 
 from app.schemas.Campaign_Info import  Product
+from app.config import DOWNLOAD_CONCURRENCY, DOWNLOAD_TIMEOUT, DOWNLOAD_DEADLINE, GEMINI_IMAGE_MODEL, SAVE_GENERATED_PAGES, OUTPUTS_DIR
+from app.services.image_cache import image_cache
+from app.services.gemini_gateway import gemini
+from app.services.image_limits import ImageTooLarge, probe
+from app.services.image_preprocess import PreparedImage, prepare_image
+from app.services.result_cache import result_cache
+from app.services.artifacts import FlyerArtifact
+from app.services.metrics import register_stats, track
+from app.services.single_flight import SingleFlight
 
-load_dotenv()
 
-OUTPUTS_DIR = "outputs"
-if not os.path.exists(OUTPUTS_DIR):
-    os.makedirs(OUTPUTS_DIR)
+logger = logging.getLogger(__name__)
 
+# Model inputs may be downloaded (encoded) bytes or images already run through prepare_image
+InputImage = Union[bytes, PreparedImage]
 
-# Initialize Gemini client
-client = genai.Client()
-logger = logging.getLogger(__name__)
+_download_executor = ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY, thread_name_prefix="image-download")
+
+# Campaigns running side by side share one fetch per URL and one model call per identical page
+_download_flights = SingleFlight("download")
+_generation_flights = SingleFlight("generation")
+
+register_stats("flyer_coalesced_downloads", _download_flights.stats, "Image downloads coalesced onto an in-flight fetch", counters=("executed", "coalesced", "recent_hits"))
+register_stats("flyer_coalesced_generations", _generation_flights.stats, "Page generations coalesced onto an in-flight call", counters=("executed", "coalesced", "recent_hits"))
+
+
+def download_image(url: str) -> bytes:
+    """Download image from URL and return its encoded bytes (checked, not decoded)"""
+    url = str(url)
+    return _download_flights.do(url, _download_image, url)
 
-def download_image(url: str) -> Image.Image:
-    """Download image from URL and return PIL Image object"""
+
+@track("download")
+def _download_image(url: str) -> bytes:
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache'
         }
-        response = requests.get(str(url), timeout=30, headers=headers, allow_redirects=True)
-        if response.status_code != 200:
-            logger.error(f"Failed to download image from {url}: {response.status_code}")
-
-        response.raise_for_status()
+        url = str(url)
+        # Served from memory or the disk cache when fresh, revalidated with ETag/Last-Modified otherwise
+        data = image_cache.fetch_bytes(url, headers=headers, timeout=DOWNLOAD_TIMEOUT)
         
-        # Try to open the image directly - PIL will validate if it's a real image
+        # Only the header is read here - PIL will validate if it's a real image and the pixel limit is checked.
+        # Decoding and re-encoding happen later in the image worker pool (prepare_image)
         try:
-            image = Image.open(BytesIO(response.content))
-            # Verify it's actually an image by trying to access basic properties
-            _ = image.size
-            _ = image.mode
-            return image
+            probe(data, source=url)
+        except ImageTooLarge:
+            raise
         except Exception as img_error:
             # If PIL can't open it, it's not a valid image
-            content_type = response.headers.get('content-type', 'unknown')
-            raise ValueError(f"Downloaded content is not a valid image. Content-Type: {content_type}, Size: {len(response.content)} bytes")
+            raise ValueError(f"Downloaded content is not a valid image. Size: {len(data)} bytes")
+
+        return data
             
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except requests.RequestException as e:
         raise HTTPException(status_code=400, detail=f"Failed to download image from {url}: {str(e)}")
     except ValueError as e:
@@ -58,6 +73,40 @@ def download_image(url: str) -> Image.Image:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process image from {url}: {str(e)}")
 
+def download_images(urls: List[str], deadline: Optional[float] = None, errors: Optional[Dict[str, HTTPException]] = None) -> Dict[str, bytes]:
+    """Download many images in parallel and return their bytes keyed by URL.
+
+    Duplicate URLs are fetched once. Concurrency is bounded by DOWNLOAD_CONCURRENCY
+    overall and DOWNLOAD_PER_HOST_LIMIT per host; the whole batch must finish within
+    `deadline` seconds (DOWNLOAD_DEADLINE by default). When an `errors` dict is given,
+    failed URLs are recorded there (and left out of the result) instead of raising.
+
+    The deadline only bounds the wait: downloads still queued are cancelled, but one
+    already running keeps its download thread and host slot until it completes or
+    stalls for DOWNLOAD_TIMEOUT, since other campaigns may be coalesced onto it.
+    """
+    unique_urls = list(dict.fromkeys(str(url) for url in urls))
+    futures = {url: _download_executor.submit(download_image, url) for url in unique_urls}
+
+    done, not_done = wait(futures.values(), timeout=deadline or DOWNLOAD_DEADLINE)
+    if not_done:
+        for future in not_done:
+            # No-op for running fetches: they finish in the background (and still fill the image cache)
+            future.cancel()
+        raise HTTPException(
+            status_code=504,
+            detail=f"Timed out downloading {len(not_done)} of {len(unique_urls)} images",
+        )
+
+    if errors is not None:
+        errors.update({url: future.exception() for url, future in futures.items() if future.exception() is not None})
+        futures = {url: future for url, future in futures.items() if url not in errors}
+
+    # Surfaces the first failed download as its HTTPException
+    images = {url: future.result() for url, future in futures.items()}
+    logger.info(f"Downloaded {len(images)} images")
+    return images
+
 def format_products_info(products: List[Product]) -> str:
     """Format products information for the prompt"""
     products_info = []
@@ -70,42 +119,51 @@ def format_products_info(products: List[Product]) -> str:
         )
     return "\n".join(products_info)
 
-def generate_flyer(prompt: str, product_images: List[Image.Image], logo_image: Optional[Image.Image] = None, reference_image: Optional[Image.Image] = None) -> List[str]:
-    """Generate flyer using Gemini API and save to local files"""
+@track("generate")
+def generate_flyer(prompt: str, product_images: List[InputImage], logo_image: Optional[InputImage] = None, reference_image: Optional[InputImage] = None, use_cache: bool = True) -> List[FlyerArtifact]:
+    """Generate flyer pages using Gemini API and return them as in-memory artifacts"""
     try:
-        # Prepare content list
-        content = [prompt]
-        content.extend(product_images)
+        # Prepare inputs (downscaled and encoded once in the image workers, then cached)
+        inputs = [prepare_image(image, "product") for image in product_images]
         
         if logo_image:
-            content.append(logo_image)
+            inputs.append(prepare_image(logo_image, "logo"))
             
         if reference_image:
-            content.append(reference_image)
+            inputs.append(prepare_image(reference_image, "reference"))
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=content,
-        )
+        # Identical prompt + inputs were generated before: reuse the stored page
+        cache_key = result_cache.key(GEMINI_IMAGE_MODEL, prompt, inputs)
+        generated_images = _generation_flights.do((cache_key, use_cache), _generate_images, cache_key, prompt, inputs, use_cache)
 
-        generated_image_urls = []
-        for i, part in enumerate(response.candidates[0].content.parts):
-            if part.inline_data is not None:
-                # Generate unique filename
+        artifacts = []
+        for i, image_data in enumerate(generated_images):
+            artifact = FlyerArtifact(image_data, metadata={"index": i, "model": GEMINI_IMAGE_MODEL})
+            if SAVE_GENERATED_PAGES:
+                # Optional local copy, e.g. to inspect pages while debugging
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 unique_id = str(uuid.uuid4())[:8]
-                filename = f"flyer_{timestamp}_{unique_id}_{i}.png"
-                filepath = os.path.join(OUTPUTS_DIR, filename)
-                
-                # Save image to local file
-                image = Image.open(BytesIO(part.inline_data.data))
-                image.save(filepath, "PNG")
-                
-                # Create localhost URL
-                image_url = f"http://localhost:8000/outputs/{filename}"
-                generated_image_urls.append(image_url)
-                
-        return generated_image_urls
+                artifact.save(os.path.join(OUTPUTS_DIR, f"flyer_{timestamp}_{unique_id}_{i}.{artifact.extension}"))
+            artifacts.append(artifact)
+            
+        return artifacts
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate flyer: {str(e)}")
+
+
+def _generate_images(cache_key: str, prompt: str, inputs: List[PreparedImage], use_cache: bool) -> List[bytes]:
+    """Encoded page images for one model call, from the result cache when allowed"""
+    generated_images = result_cache.get(cache_key) if use_cache else None
+    if generated_images is None:
+        response = gemini.generate_content(
+            model=GEMINI_IMAGE_MODEL,
+            contents=[prompt] + [image.to_part() for image in inputs],
+        )
+        generated_images = [
+            part.inline_data.data
+            for part in response.candidates[0].content.parts
+            if part.inline_data is not None
+        ]
+        result_cache.put(cache_key, generated_images)
+    return generated_images
@@ -0,0 +1,169 @@
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.config import (
+    GEMINI_REQUESTS_PER_MINUTE,
+    GEMINI_MAX_CONCURRENT,
+    GEMINI_MAX_RETRIES,
+    GEMINI_BACKOFF_BASE,
+    GEMINI_BACKOFF_MAX,
+)
+from app.services.clients import genai_client
+from app.services.metrics import register_stats, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 429 is quota, the 5xx codes are transient server-side failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Blocking token bucket refilled at `rate_per_minute`, shared by all threads"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. after the API reported quota exhaustion"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class GeminiGateway:
+    """Process-wide entry point for Gemini calls.
+
+    Every call takes a token from a requests/minute bucket and a slot from a
+    concurrency semaphore. Retryable errors are retried with jittered exponential
+    backoff (or the server's retry hint) within a bounded retry budget; a 429 also
+    pauses the bucket so other callers don't stampede the quota at the same time.
+    """
+
+    def __init__(self, requests_per_minute: float, max_concurrent: int, max_retries: int, backoff_base: float, backoff_max: float):
+        self.bucket = TokenBucket(requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "in_flight": 0,
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+        }
+
+    @property
+    def client(self):
+        """The shared genai.Client (tests and benchmarks may set _client to a stand-in)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai_client()
+        return self._client
+
+    def generate_content(self, model: str, contents: Any, **kwargs):
+        """Rate-limited, retrying wrapper around client.models.generate_content"""
+        from google.genai.errors import APIError
+
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            self._record(throttled_seconds=waited)
+            try:
+                with self._slots:
+                    self._record(calls=1, in_flight=1)
+                    try:
+                        with stage_timer("gemini_call"):
+                            return self.client.models.generate_content(model=model, contents=contents, **kwargs)
+                    finally:
+                        self._record(in_flight=-1)
+            except APIError as e:
+                if e.code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    self._record(failures=1)
+                    raise
+
+                retry_after = self._retry_after(e)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if e.code == 429:
+                    self.bucket.pause(delay)
+                    self._record(rate_limited=1)
+                attempt += 1
+                logger.warning(f"Gemini returned {e.code}, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                self._record(retries=1, backoff_seconds=delay)
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _record(self, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform between 0 and the capped exponential delay
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, error) -> Optional[float]:
+        """Server-provided retry delay, from the Retry-After header or google.rpc.RetryInfo"""
+        headers = getattr(error.response, "headers", None) or {}
+        value = headers.get("retry-after") if hasattr(headers, "get") else None
+        if value:
+            try:
+                return min(self.backoff_max, float(value))
+            except ValueError:
+                pass
+
+        details = error.details.get("error", error.details) if isinstance(error.details, dict) else {}
+        for detail in details.get("details", []) or []:
+            if isinstance(detail, dict) and detail.get("@type", "").endswith("RetryInfo"):
+                match = re.match(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+                if match:
+                    # Jitter the hint a little so paused callers don't all wake at once
+                    return min(self.backoff_max, float(match.group(1))) + random.uniform(0, 1)
+        return None
+
+
+gemini = GeminiGateway(
+    requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+    max_concurrent=GEMINI_MAX_CONCURRENT,
+    max_retries=GEMINI_MAX_RETRIES,
+    backoff_base=GEMINI_BACKOFF_BASE,
+    backoff_max=GEMINI_BACKOFF_MAX,
+)
+
+register_stats(
+    "flyer_gemini", gemini.stats, "Shared Gemini gateway",
+    counters=("calls", "retries", "failures", "rate_limited", "throttled_seconds", "backoff_seconds"),
+)
@@ -0,0 +1,38 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import DOWNLOAD_CONCURRENCY, DOWNLOAD_PER_HOST_LIMIT
+
+_session = None
+_session_lock = threading.Lock()
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled HTTP session (keep-alive, reused TLS connections)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=DOWNLOAD_CONCURRENCY, pool_maxsize=DOWNLOAD_CONCURRENCY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    """Semaphore limiting concurrent requests against the host of url"""
+    host = urlsplit(url).netloc.lower()
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(DOWNLOAD_PER_HOST_LIMIT)
+            _host_slots[host] = slot
+        return slot
@@ -0,0 +1,288 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config import (
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MEMORY_ITEMS,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_CACHE_MAX_AGE,
+    IMAGE_CACHE_FRESH_SECONDS,
+    DOWNLOAD_TIMEOUT,
+)
+from app.services.http_session import get_session, host_slot
+from app.services.image_limits import read_limited
+from app.services.index_file import index_lock, read_index, write_index
+from app.services.metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Access times of cache hits are written to the index at most this often (and on flush())
+_ACCESS_FLUSH_SECONDS = 30
+# Blobs written this recently are never deleted: another process may be about to index them
+_BLOB_GRACE_SECONDS = 60
+
+
+class ImageCache:
+    """Two-tier URL-keyed image cache.
+
+    - memory: bounded LRU of downloaded bytes, so hot images skip the disk read
+    - disk: raw bytes stored content-addressed under blobs/<sha256>, with an index
+      mapping URL -> digest and the HTTP validators (ETag / Last-Modified) used to
+      revalidate entries older than IMAGE_CACHE_FRESH_SECONDS.
+
+    Several processes share the directory: each save re-reads index.json under a file
+    lock and merges it with this process's entries, so nobody's entries are lost and a
+    blob is only deleted when no merged entry points to it.
+    """
+
+    def __init__(self, cache_dir: str, memory_items: int, max_bytes: int, max_age: float, fresh_seconds: float):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fresh_seconds = fresh_seconds
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._index: Optional[Dict[str, dict]] = None
+        # URL -> digest of entries dropped here since the last save, removed from the shared index on save
+        self._removed: Dict[str, str] = {}
+        self._saved_at = time.time()
+        self._access_dirty = False
+        self._lock = threading.RLock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    # ---- memory tier -------------------------------------------------------
+
+    def _remember(self, url: str, data: bytes):
+        # Caller holds the lock
+        self._memory[url] = data
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # ---- disk tier ---------------------------------------------------------
+
+    def fetch_bytes(self, url: str, headers: Optional[dict] = None, timeout: float = DOWNLOAD_TIMEOUT) -> bytes:
+        """Return the body of url, from memory or disk when fresh or revalidated, else from the network.
+
+        Raises requests.RequestException on network / HTTP errors, like requests itself,
+        and ImageTooLarge for bodies over DOWNLOAD_MAX_BYTES.
+        """
+        with self._lock:
+            entry = self._load_index().get(url)
+            data = self._memory.get(url)
+            if data is not None and entry is not None and self._is_fresh(entry):
+                self._memory.move_to_end(url)
+                self._touch(entry)
+                self._stats["memory_hits"] += 1
+                return data
+            if entry is None:
+                # Possibly fetched by another worker process since our last save
+                entry = self._refresh().get(url)
+            data = self._read_blob(entry["digest"]) if entry else None
+            if entry and data is None:
+                # Blob vanished underneath us, forget the entry (here and, on the next save, in the shared index)
+                self._index.pop(url, None)
+                self._removed[url] = entry["digest"]
+                entry = None
+            if entry and self._is_fresh(entry):
+                self._touch(entry)
+                self._remember(url, data)
+                self._stats["disk_hits"] += 1
+                return data
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        with host_slot(url):
+            # Streamed, so an oversized body is refused from Content-Length or part way through
+            response = get_session().get(url, timeout=timeout, headers=request_headers, allow_redirects=True, stream=True)
+            body = None
+            try:
+                if response.status_code == 200:
+                    body = read_limited(response.iter_content(chunk_size=64 * 1024), response.headers.get("Content-Length"), url)
+            finally:
+                response.close()
+
+        if entry and response.status_code == 304:
+            with self._lock:
+                entry["fetched_at"] = entry["accessed_at"] = time.time()
+                self._stats["revalidated"] += 1
+                self._remember(url, data)
+                self._save_index()
+            return data
+
+        if response.status_code != 200:
+            logger.error(f"Failed to download image from {url}: {response.status_code}")
+        response.raise_for_status()
+
+        with self._lock:
+            self._stats["misses"] += 1
+            self._store(url, body, response.headers)
+            self._remember(url, body)
+        return body
+
+    def flush(self):
+        """Write pending access times to the shared index (e.g. at shutdown)"""
+        with self._lock:
+            if self._access_dirty:
+                self._save_index()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            digests = {entry["digest"]: entry["size"] for entry in index.values()}
+            return {
+                **self._stats,
+                "memory_items": len(self._memory),
+                "disk_entries": len(index),
+                "disk_bytes": sum(digests.values()),
+            }
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _touch(self, entry: dict):
+        # Caller holds the lock. Hits only update memory; they reach the index in batches
+        entry["accessed_at"] = time.time()
+        self._access_dirty = True
+        if time.time() - self._saved_at > _ACCESS_FLUSH_SECONDS:
+            self._save_index()
+
+    def _is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.fresh_seconds
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _read_blob(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store(self, url: str, data: bytes, headers):
+        digest = self.digest(data)
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            # Fresh mtime keeps another process from deleting it before our index is saved
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        self._load_index()[url] = {
+            "digest": digest,
+            "size": len(data),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": now,
+            "accessed_at": now,
+        }
+        self._save_index()
+
+    def _evict(self):
+        index = self._load_index()
+        now = time.time()
+
+        # Age-based: drop entries nobody has used for max_age seconds
+        for url in [u for u, e in index.items() if now - e["accessed_at"] > self.max_age]:
+            self._drop(url)
+
+        # Size-based: drop least recently used entries until under budget
+        def total_bytes():
+            return sum({e["digest"]: e["size"] for e in index.values()}.values())
+
+        if total_bytes() > self.max_bytes:
+            for url in sorted(index, key=lambda u: index[u]["accessed_at"]):
+                self._drop(url)
+                if total_bytes() <= self.max_bytes:
+                    break
+
+    def _drop(self, url: str):
+        # Caller holds the file lock, so self._index is the merged index of every process
+        entry = self._index.pop(url)
+        self._memory.pop(url, None)
+        self._stats["evictions"] += 1
+        # Blobs are shared by every URL with identical content
+        if not any(e["digest"] == entry["digest"] for e in self._index.values()):
+            path = self._blob_path(entry["digest"])
+            try:
+                if time.time() - os.path.getmtime(path) > _BLOB_GRACE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            self._index = read_index(self.index_path)
+        return self._index
+
+    def _refresh(self) -> Dict[str, dict]:
+        """Pick up entries other processes saved (read only, our own entries win)"""
+        index = self._load_index()
+        for url, entry in read_index(self.index_path).items():
+            if url not in index and self._removed.get(url) != entry["digest"]:
+                index[url] = entry
+        return index
+
+    def _save_index(self):
+        """Merge with the index on disk, evict and write it back, all under the file lock"""
+        with index_lock(self.index_path):
+            merged = read_index(self.index_path)
+            for url, digest in self._removed.items():
+                if merged.get(url, {}).get("digest") == digest:
+                    del merged[url]
+            for url, entry in self._load_index().items():
+                other = merged.get(url)
+                if other is None:
+                    # Unknown on disk: new here, or dropped by another process (then its blob may be gone)
+                    if os.path.exists(self._blob_path(entry["digest"])):
+                        merged[url] = entry
+                elif entry["fetched_at"] >= other["fetched_at"]:
+                    merged[url] = {**entry, "accessed_at": max(entry["accessed_at"], other["accessed_at"])}
+                else:
+                    merged[url] = {**other, "accessed_at": max(entry["accessed_at"], other["accessed_at"])}
+            self._index = merged
+            self._removed = {}
+            self._evict()
+            write_index(self.index_path, self._index)
+        self._saved_at = time.time()
+        self._access_dirty = False
+
+
+image_cache = ImageCache(
+    cache_dir=IMAGE_CACHE_DIR,
+    memory_items=IMAGE_CACHE_MEMORY_ITEMS,
+    max_bytes=IMAGE_CACHE_MAX_BYTES,
+    max_age=IMAGE_CACHE_MAX_AGE,
+    fresh_seconds=IMAGE_CACHE_FRESH_SECONDS,
+)
+
+register_stats(
+    "flyer_image_cache", image_cache.stats, "Image download cache",
+    counters=("memory_hits", "disk_hits", "revalidated", "misses", "evictions"),
+)
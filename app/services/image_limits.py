@@ -0,0 +1,67 @@
+import math
+import warnings
+from io import BytesIO
+from typing import Iterable, Optional, Tuple
+
+from PIL import Image
+
+from app.config import DOWNLOAD_MAX_BYTES, IMAGE_MAX_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    """An input image over the byte or pixel limits"""
+
+
+def check_bytes(size: Optional[int], source: str, max_bytes: int = DOWNLOAD_MAX_BYTES):
+    if size is not None and size > max_bytes:
+        raise ImageTooLarge(f"Image from {source} is {size} bytes, the limit is {max_bytes}")
+
+
+def read_limited(chunks: Iterable[bytes], declared_size: Optional[str], source: str, max_bytes: int = DOWNLOAD_MAX_BYTES) -> bytes:
+    """Join a streamed body, failing as soon as Content-Length or the running count is over max_bytes"""
+    if declared_size and declared_size.isdigit():
+        check_bytes(int(declared_size), source, max_bytes)
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        check_bytes(len(buffer), source, max_bytes)
+    return bytes(buffer)
+
+
+def probe(data: bytes, source: str = "input") -> Tuple[str, Tuple[int, int]]:
+    """Format and size from the image header (nothing decoded); rejects images over IMAGE_MAX_PIXELS"""
+    try:
+        with warnings.catch_warnings():
+            # PIL only warns up to twice its own limit; ours is checked explicitly below
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(BytesIO(data)) as image:
+                image_format, size = image.format, image.size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(f"Image from {source} is too large: {e}")
+    _check_pixels(size, source)
+    return image_format, size
+
+
+def open_image(data: bytes, max_side: Optional[int] = None, source: str = "input") -> Image.Image:
+    """Decode image bytes once the header passed the pixel limit.
+
+    JPEGs larger than max_side are decoded at a reduced scale (never below max_side),
+    so a 24 MP photo costs a fraction of its full-size decode.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(BytesIO(data))
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(f"Image from {source} is too large: {e}")
+    _check_pixels(image.size, source)
+    if max_side and image.format == "JPEG" and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image.draft(image.mode, (math.ceil(image.size[0] * scale), math.ceil(image.size[1] * scale)))
+    image.load()
+    return image
+
+
+def _check_pixels(size: Tuple[int, int], source: str):
+    if size[0] * size[1] > IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(f"Image from {source} is {size[0]}x{size[1]} pixels, the limit is {IMAGE_MAX_PIXELS}")
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Union
+
+from PIL import Image
+
+from app.config import (
+    PREPROCESS_PRODUCT_MAX_SIDE,
+    PREPROCESS_LOGO_MAX_SIDE,
+    PREPROCESS_REFERENCE_MAX_SIDE,
+    PREPROCESS_JPEG_QUALITY,
+    PREPROCESS_CACHE_ITEMS,
+)
+from app.services.image_limits import open_image
+from app.services.image_workers import image_workers
+from app.services.metrics import track
+
+logger = logging.getLogger(__name__)
+
+# Longest side (px) each kind of model input is scaled down to
+ROLE_MAX_SIDE = {
+    "product": PREPROCESS_PRODUCT_MAX_SIDE,
+    "logo": PREPROCESS_LOGO_MAX_SIDE,
+    "reference": PREPROCESS_REFERENCE_MAX_SIDE,
+}
+
+
+class PreparedImage:
+    """A model input image, already downscaled and encoded once"""
+
+    def __init__(self, data: bytes, mime_type: str, size: tuple, source_digest: str):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self.source_digest = source_digest
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    def to_part(self):
+        from google.genai import types
+        # Handing the SDK encoded bytes stops it re-encoding a PIL image as PNG on every call
+        return types.Part.from_bytes(data=self.data, mime_type=self.mime_type)
+
+
+_cache: "OrderedDict[tuple, PreparedImage]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prepare_image(image: Union[bytes, PreparedImage], role: str) -> PreparedImage:
+    """Downscale, normalise the colour mode, drop metadata and re-encode an input image.
+
+    Encoded bytes (a download, a generated page, a file on disk) go through prepare_encoded();
+    images already prepared are returned as they are.
+    """
+    if isinstance(image, PreparedImage):
+        return image
+    return prepare_encoded(image, role)
+
+
+def prepare_encoded(data: bytes, role: str) -> PreparedImage:
+    """Prepare a model input from encoded bytes.
+
+    Decoding and re-encoding happen in the image worker pool; results are cached by
+    (digest of the bytes, role), so an image shared by several pages is only prepared once.
+    """
+    key = (hashlib.sha256(data).hexdigest(), role)
+    with _cache_lock:
+        prepared = _cache.get(key)
+        if prepared is not None:
+            _cache.move_to_end(key)
+            return prepared
+
+    with track("preprocess"):
+        encoded, mime_type, size = image_workers.run(encode_bytes, data, ROLE_MAX_SIDE[role])
+    prepared = PreparedImage(encoded, mime_type, size, key[0])
+    _remember(key, prepared)
+    logger.info(f"Prepared {role} image ({len(data)} bytes) -> {size}, {len(encoded)} bytes")
+    return prepared
+
+
+def _remember(key: tuple, prepared: PreparedImage):
+    with _cache_lock:
+        _cache[key] = prepared
+        while len(_cache) > PREPROCESS_CACHE_ITEMS:
+            _cache.popitem(last=False)
+
+
+def encode_bytes(data: bytes, max_side: int) -> tuple:
+    """Image worker task: (encoded bytes, mime type, size) of a model input made from encoded bytes"""
+    # Checked against the pixel limit from the header; JPEG sources are decoded straight at a reduced scale
+    with open_image(data, max_side) as image:
+        return _encode_pixels(image, max_side)
+
+
+def _encode_pixels(image: Image.Image, max_side: int) -> tuple:
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image = image.convert("RGBA")
+        # Only keep the alpha channel (and PNG) when it is actually used
+        if image.getchannel("A").getextrema()[0] == 255:
+            image = image.convert("RGB")
+            has_alpha = False
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if max(image.size) > max_side:
+        # thumbnail() resizes in place and keeps the aspect ratio, never touch the cached source
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buffer = BytesIO()
+    # Saving without exif/icc_profile strips the source metadata
+    if has_alpha:
+        image.save(buffer, "PNG", optimize=True)
+        mime_type = "image/png"
+    else:
+        image.save(buffer, "JPEG", quality=PREPROCESS_JPEG_QUALITY, optimize=True)
+        mime_type = "image/jpeg"
+    return buffer.getvalue(), mime_type, image.size
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.util
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.config import IMAGE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class ImageWorkers:
+    """Process pool for CPU-bound image work (decode, resize, convert, encode, PDF pages).
+
+    PIL holds the GIL for most of that work, so on threads one campaign's pages slow every
+    other campaign down. Tasks are module-level functions taking and returning encoded
+    bytes, so only compact payloads cross the process boundary. With `workers` = 0 tasks
+    run inline in the calling thread. The pool is started on first use (or by warm-up) with
+    the spawn method: forking a process that already runs request threads is unsafe.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker processes ahead of the first task"""
+        if self.workers > 0:
+            futures = [self._get_pool().submit(_ping) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        if self.workers <= 0:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_pool().submit(fn, *args)
+
+    def run(self, fn: Callable, *args):
+        """fn(*args) in a worker process; the calling thread waits without holding the GIL"""
+        try:
+            return self.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._discard_broken_pool()
+            raise
+
+    async def run_async(self, fn: Callable, *args):
+        """Awaitable fn(*args), for callers on the event loop"""
+        try:
+            return await asyncio.wrap_future(self.submit(fn, *args))
+        except BrokenProcessPool:
+            self._discard_broken_pool()
+            raise
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _discard_broken_pool(self):
+        # A worker died (e.g. killed for memory): start a fresh pool for the next task
+        with self._lock:
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    logger.info(f"Starting {self.workers} image worker process(es)")
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                    # Processes started by multiprocessing (e.g. uvicorn workers) skip the atexit hook that
+                    # stops the pool, then wait for its workers forever: stop it from their exit path too,
+                    # ahead of the queue finalizers (priority 10) that would drop the stop sentinels
+                    multiprocessing.util.Finalize(self, self.shutdown, kwargs={"wait": True}, exitpriority=100)
+        return self._pool
+
+
+def _ping():
+    return True
+
+
+image_workers = ImageWorkers(IMAGE_WORKERS)
@@ -0,0 +1,35 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+@contextmanager
+def index_lock(index_path: str) -> Iterator[None]:
+    """Exclusive lock on an index.json shared by several worker processes (held across read, merge and write)"""
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    with open(f"{index_path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_index(index_path: str) -> Dict[str, dict]:
+    """The index as last saved by any process ({} when missing or unreadable)"""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(index_path: str, index: Dict[str, dict]):
+    """Atomically replace the index (readers never see a partial file)"""
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
@@ -0,0 +1,134 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.config import FLYER_JOB_WORKERS, FLYER_JOB_QUEUE_LIMIT, FLYER_JOB_RETENTION
+from app.services.metrics import IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """State of one background flyer generation job"""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.pages_total = 0
+        self.pages_completed = 0
+        self.pages: List[Dict[str, Any]] = []
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def progress(self, stage: str, **details):
+        """Progress callback handed to the flyer pipeline"""
+        with self._lock:
+            if stage == "page_ready":
+                # Per-page event, not a stage change
+                self.pages.append(details)
+                return
+            self.stage = stage
+            if "pages_total" in details:
+                self.pages_total = details["pages_total"]
+            if "pages_completed" in details:
+                self.pages_completed = details["pages_completed"]
+
+    def run(self, fn: Callable[..., Any], *args, **kwargs):
+        """Run fn(*args, progress=self.progress, **kwargs), recording the outcome on the job"""
+        with self._lock:
+            self.status = "running"
+            self.started_at = datetime.now()
+        try:
+            with IN_FLIGHT.labels(kind="jobs").track_inprogress():
+                result = fn(*args, progress=self.progress, **kwargs)
+            with self._lock:
+                self.result = result
+                self.status = "completed"
+                self.stage = "completed"
+        except HTTPException as e:
+            logger.error(f"Flyer job {self.id} failed: {e.detail}")
+            with self._lock:
+                self.error = str(e.detail)
+                self.status = "failed"
+        except Exception as e:
+            logger.error(f"Flyer job {self.id} failed: {str(e)}")
+            with self._lock:
+                self.error = str(e)
+                self.status = "failed"
+        finally:
+            with self._lock:
+                self.finished_at = datetime.now()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "pages_total": self.pages_total,
+                "pages_completed": self.pages_completed,
+                "pages": list(self.pages),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+                "result": self.result,
+            }
+
+
+class JobManager:
+    """Runs flyer jobs on a bounded worker pool, off the event loop"""
+
+    def __init__(self, max_workers: int, queue_limit: int, retention: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flyer-job")
+        self._queue_limit = queue_limit
+        self._retention = retention
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args) -> Job:
+        """Queue fn(*args, progress=job.progress) and return the job right away"""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self._queue_limit:
+                raise HTTPException(status_code=503, detail="Too many flyer jobs in progress, try again later")
+
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(job.run, fn, *args)
+        logger.info(f"Queued flyer job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        # Drop the oldest finished jobs once we keep more than the retention limit
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        while len(self._jobs) > self._retention and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+
+job_manager = JobManager(
+    max_workers=FLYER_JOB_WORKERS,
+    queue_limit=FLYER_JOB_QUEUE_LIMIT,
+    retention=FLYER_JOB_RETENTION,
+)
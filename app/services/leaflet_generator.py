@@ -1,56 +1,67 @@
 
 import os
-import time
-from io import BytesIO
-from PIL import Image
-from google import genai
-from google.genai.errors import ClientError
-from app.services.upload import upload_image,upload_pdf
-import shutil
-
-from app.config import GEMINI_API_KEY,GENERATED_DIR
-
-# Initialize Gemini client
-client = genai.Client(api_key=GEMINI_API_KEY)
+import uuid
+import logging
+from datetime import datetime
+from typing import Optional
+from app.services.gemini_gateway import gemini
+from app.services.image_preprocess import PreparedImage, prepare_encoded
+from app.services.result_cache import result_cache
+from app.services.artifacts import FlyerArtifact
+from app.services.pdf_writer import StreamingPdfWriter
+from app.services.upload import discard_uploads, upload_image_async, upload_pdf_async
+from app.services.metrics import track
+from app.services.style_library import style_library
+from app.services.workspace import workspace
+from app.services.pagination import paginate
+
+from app.config import GEMINI_IMAGE_MODEL, OUTPUTS_DIR, SAVE_GENERATED_PAGES
+
+logger = logging.getLogger(__name__)
+
+
+@track("leaflet_page")
+def generate_flyer_page(prompt: str, images: list, output_prefix=None, use_cache: bool = True):
+    """Generate one leaflet page and return it as in-memory artifacts (saved only if output_prefix is given)"""
+    # Identical prompt + inputs were generated before: reuse the stored page
+    cache_key = result_cache.key(GEMINI_IMAGE_MODEL, prompt, images)
+    generated_images = result_cache.get(cache_key) if use_cache else None
+
+    if generated_images is None:
+        # Rate limiting and 429 retries are handled by the shared gateway
+        response = gemini.generate_content(
+            model=GEMINI_IMAGE_MODEL,
+            contents=[prompt] + [image.to_part() if isinstance(image, PreparedImage) else image for image in images],
+        )
+        candidate = response.candidates[0]
 
+        # Ensure candidate.content and parts exist
+        if not getattr(candidate, "content", None) or not getattr(candidate.content, "parts", None):
+            logger.warning("No image parts returned by Gemini")
+            return []  # empty list
 
-def generate_flyer_page(prompt: str, images: list, output_prefix="flyer_page"):
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=[prompt] + images,
-        )
-    except ClientError as e:
-        if e.status_code == 429:
-            print("Quota exceeded. Retrying in 60s...")
-            time.sleep(60)
-            return generate_flyer_page(prompt, images, output_prefix)
-        else:
-            raise
+        generated_images = []
+        for part in candidate.content.parts:
+            if getattr(part, "inline_data", None):
+                generated_images.append(part.inline_data.data)
+            elif getattr(part, "text", None):
+                logger.info(f"Model text output: {part.text}")
+        result_cache.put(cache_key, generated_images)
 
-    saved_files = []
-    candidate = response.candidates[0]
+    artifacts = []
+    for i, image_data in enumerate(generated_images):
+        artifact = FlyerArtifact(image_data, metadata={"index": i, "model": GEMINI_IMAGE_MODEL})
+        if output_prefix:
+            artifact.save(f"{output_prefix}_{i}.{artifact.extension}")
+            logger.info(f"Saved generated image: {artifact.path}")
+        artifacts.append(artifact)
 
-    # Ensure candidate.content and parts exist
-    if not getattr(candidate, "content", None) or not getattr(candidate.content, "parts", None):
-        print("No image parts returned by Gemini.")
-        return saved_files  # empty list
+    return artifacts
 
-    i = 0
-    for part in candidate.content.parts:
-        if getattr(part, "inline_data", None):
-            image = Image.open(BytesIO(part.inline_data.data))
-            if image.mode in ("P", "RGBA"):
-                image = image.convert("RGB")
-            filename = f"{output_prefix}_{i}.png"
-            image.save(filename)
-            saved_files.append(filename)
-            print(f" Saved generated image: {filename}")
-            i += 1
-        elif getattr(part, "text", None):
-            print("Text output:", part.text)
 
-    return saved_files
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
 
 
 def build_prompt(supermarket_info: dict, products: list):
@@ -101,89 +112,90 @@ def build_prompt(supermarket_info: dict, products: list):
 
 
 
-def generate_flyer_pdf(request: dict, output_pdf="flyer_campaign.pdf"):
+@track("leaflet", in_flight="leaflets")
+def generate_flyer_pdf(request: dict, output_pdf: Optional[str] = None):
+    # The PDF is written to a scratch folder removed when the job ends, even on failure; pages
+    # already published when a later one fails are taken down again
+    uploads = []
+    with workspace.job("leaflet") as job_dir:
+        try:
+            return _generate_leaflet(request, output_pdf or os.path.join(job_dir, "flyer_campaign.pdf"), uploads)
+        except Exception:
+            discard_uploads(uploads)
+            raise
+
+
+def _generate_leaflet(request: dict, output_pdf: str, uploads: list):
     products = request["products"]
-    per_page = request.get("products_per_page", 3)  # default 3 per page
+    per_page = request.get("products_per_page", 3)  # at most 3 per page by default
     flyer_images = []
+    image_uploads = []
     total_products = len(products)
+    # Optional local copies of the pages (kept in outputs/, like generate_flyer's)
+    page_prefix = f"leaflet_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    # Fewest pages per_page allows, evenly filled ("pagination": "fixed" keeps full pages with the remainder last)
+    pages, plan = paginate(products, per_page, request.get("pagination", "balanced"), request.get("group_by"))
 
-    # Preload logo once and convert to RGB
-    with Image.open(request["logo_path"]) as img:
-        logo_img = img.copy()
-        if logo_img.mode in ("P", "RGBA"):
-            logo_img = logo_img.convert("RGB")
-
-    # Prepare output folder
-    output_path = os.path.join(GENERATED_DIR, request['supermarket_name'])
-    os.makedirs(output_path, exist_ok=True)
-    print("output path--------", output_path)
-
-    background_image = None  # Keep background fixed from first page
-
-    for i in range(0, total_products, per_page):
-        chunk = products[i:i + per_page]
-        prompt = build_prompt(request, chunk) + f"\n(Total products in campaign: {total_products})"
-
-        # Start building image input list (logo always first)
-        img_inputs = [logo_img.copy()]
-
-        # Add product images (convert each to RGB)
-        for p in chunk:
-            with Image.open(p["product_path"]) as img:
-                img_copy = img.copy()
-                if img_copy.mode in ("P", "RGBA"):
-                    img_copy = img_copy.convert("RGB")
-                img_inputs.append(img_copy)
-
-        # Use the same background for all pages
-        if background_image:
-            img_inputs.insert(1, background_image.copy())
-            print("Using fixed background for this page")
-
-        img_path = os.path.join(output_path, f"flyer_page_{i//per_page}")
-        print("generated image file path-----------------", img_path)
-
-        # Generate flyer page
-        page_files = generate_flyer_page(prompt, img_inputs, output_prefix=img_path)
-
-        # Convert Gemini-generated images to RGB just in case
-        for idx, f in enumerate(page_files):
-            with Image.open(f) as gen_img:
-                if gen_img.mode in ("P", "RGBA"):
-                    gen_img = gen_img.convert("RGB")
-                    gen_img.save(f)  # overwrite file
-            # Save only the first background, and reuse later
-            if i == 0 and idx == 0 and background_image is None:
-                background_image = Image.open(f).copy().convert("RGB")
-                print("Background fixed from first page")
+    # Preload and prepare the logo once (downscaled, RGB, re-encoded in the image worker pool)
+    logo_img = prepare_encoded(_read_bytes(request["logo_path"]), "logo")
+
+    # Keep background fixed from first page (or a stored one for the same theme and branding)
+    style_key = style_library.key(
+        "leaflet", request["theme_style"], request.get("Why_this_campaign", ""), request["supermarket_name"], logo_img.source_digest
+    )
+    background_image = style_library.reference(style_key) if request.get("reuse_style") else None
 
-        flyer_images.extend(page_files)
+    # Pages go into the PDF as they are generated, only one decoded page in memory at a time
+    with StreamingPdfWriter(output_pdf) as pdf:
+        for page_index, chunk in enumerate(pages):
+            prompt = build_prompt(request, chunk) + f"\n(Total products in campaign: {total_products})"
 
-    # Merge all pages into a single PDF
-    if flyer_images:
-        pil_imgs = []
-        for f in flyer_images:
-            with Image.open(f) as img:
-                if img.mode in ("P", "RGBA"):
-                    img = img.convert("RGB")
-                pil_imgs.append(img.copy())
-
-        pil_imgs[0].save(output_pdf, save_all=True, append_images=pil_imgs[1:])
-        print(f"Final flyer PDF saved: {output_pdf}")
-    else:
-        print("No flyer images generated.")
+            # Start building image input list (logo always first)
+            img_inputs = [logo_img]
+
+            # Add product images (prepared once per source image, cached across pages)
+            for p in chunk:
+                img_inputs.append(prepare_encoded(_read_bytes(p["product_path"]), "product"))
+
+            # Use the same background for all pages
+            if background_image:
+                img_inputs.insert(1, background_image)
+                logger.info(f"Using the fixed background for page {page_index + 1}")
 
-    # Upload images to Cloudinary
-    uploaded_images = [upload_image(f) for f in flyer_images]
+            # Pages stay in memory; they are only written when SAVE_GENERATED_PAGES is on
+            img_path = os.path.join(OUTPUTS_DIR, f"{page_prefix}_page_{page_index}") if SAVE_GENERATED_PAGES else None
 
-    # Upload PDF to Cloudinary
-    uploaded_pdf = upload_pdf(output_pdf)
+            # Generate flyer page
+            page_artifacts = generate_flyer_page(prompt, img_inputs, output_prefix=img_path, use_cache=request.get("use_cache", True))
+
+            # Save only the first background, and reuse later
+            if page_index == 0 and page_artifacts and background_image is None:
+                background_image = prepare_encoded(page_artifacts[0].data, "reference")
+                style_library.put(style_key, background_image.data, "leaflet", theme_style=request["theme_style"])
+                logger.info("Background fixed from the first page")
+
+            for artifact in page_artifacts:
+                # Upload in the background while the next page is generated
+                image_uploads.append(upload_image_async(artifact.data))
+                uploads.append(image_uploads[-1])
+                pdf.add_page(artifact.data)
+            flyer_images.extend(page_artifacts)
+
+    if flyer_images:
+        logger.info(f"Leaflet PDF saved: {output_pdf} ({len(flyer_images)} page(s))")
+    else:
+        logger.warning("No leaflet pages generated")
 
-    shutil.rmtree(output_path, ignore_errors=True)
+    # Upload PDF to storage, then collect the page uploads started during generation
+    pdf_upload = upload_pdf_async(output_pdf)
+    uploads.append(pdf_upload)
+    uploaded_images = [upload.result() for upload in image_uploads]
+    uploaded_pdf = pdf_upload.result()
 
     return {
         "images": uploaded_images,
-        "flyer_pdf": uploaded_pdf
+        "flyer_pdf": uploaded_pdf,
+        "pagination": plan.model_dump(),
     }
 
 
@@ -0,0 +1,288 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Flyer stages run from milliseconds (cache hits) to minutes (Gemini under quota pressure)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child(())
+
+    def labels(self, **labels):
+        return self._child(tuple(str(labels[name]) for name in self.labelnames))
+
+    def _child(self, key: Tuple[str, ...]):
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class _CounterChild(_Value):
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        yield f"{name}_total", labels, self.value
+
+
+class _GaugeChild(_Value):
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        yield name, labels, self.value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self, name: str, labels: Dict[str, str]) -> Iterable[Sample]:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, cumulative
+
+
+class Counter(_Metric):
+    """Monotonic count, exposed as <name>_total"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. work in flight"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def track_inprogress(self):
+        return self._default.track_inprogress()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, by default) in cumulative buckets"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Registry:
+    """Holds metrics and scrape-time collectors and renders the Prometheus text format.
+
+    Updating a metric is a lock and an addition; all formatting work happens in
+    render(), i.e. only when something scrapes /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """collector() yields (name, type, help, samples) tuples when scraped"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [(metric.name, metric.type, metric.documentation, list(metric.samples())) for metric in metrics]
+        for collector in collectors:
+            families.extend(collector())
+
+        lines = []
+        for name, metric_type, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, float]], documentation: str, counters: Sequence[str] = ()):
+    """Expose a service's stats() dict at scrape time: keys in `counters` as <prefix>_<key>_total,
+    every other numeric key as a gauge <prefix>_<key>"""
+
+    def collect():
+        for key, value in stats().items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            name = f"{prefix}_{key}"
+            if key in counters:
+                yield name, "counter", f"{documentation} ({key})", [(f"{name}_total", {}, value)]
+            else:
+                yield name, "gauge", f"{documentation} ({key})", [(name, {}, value)]
+
+    registry.add_collector(collect)
+
+
+# Shared flyer pipeline metrics
+STAGE_SECONDS = histogram(
+    "flyer_stage_seconds",
+    "Time spent per pipeline stage (download, preprocess, generate, gemini_call, pdf_page, upload, campaign)",
+    ["stage"],
+)
+FAILURES = counter("flyer_failures", "Failures per pipeline stage", ["stage"])
+RETRIES = counter("flyer_retries", "Retried operations per stage (Gemini retries are in flyer_gemini_retries_total)", ["stage"])
+IN_FLIGHT = gauge("flyer_in_flight", "Work currently running, by kind (jobs, campaigns)", ["kind"])
+
+
+def stage_timer(stage: str):
+    """Context manager recording the block's duration under flyer_stage_seconds{stage=...}"""
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+
+@contextmanager
+def track(stage: str, in_flight: Optional[str] = None):
+    """Time a stage, count it as a failure if it raises and optionally gauge it as in flight"""
+    gauge_child = IN_FLIGHT.labels(kind=in_flight) if in_flight else None
+    if gauge_child is not None:
+        gauge_child.inc()
+    try:
+        with stage_timer(stage):
+            yield
+    except BaseException:
+        FAILURES.labels(stage=stage).inc()
+        raise
+    finally:
+        if gauge_child is not None:
+            gauge_child.dec()
@@ -0,0 +1,131 @@
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+from app.schemas.Campaign_Info import PaginationPlan, PlannedPage
+
+# Product counts that fill one of the grids below exactly; other counts leave gaps or need a larger cell
+FULL_GRID_SIZES = {1, 2, 3, 4, 6, 8, 9}
+
+# How much more uneven than an even split pages may get to land on full grids
+_MAX_GRID_SPREAD = 2
+
+
+def get_optimal_grid_layout(product_count: int) -> str:
+    """Determine optimal grid layout based on product count"""
+    if product_count == 1:
+        return "1x1 (single large product)"
+    elif product_count == 2:
+        return "1x2 or 2x1 (two products side by side )"
+    elif product_count == 3:
+        return "1x3 or 3x1 (three products in a row )"
+    elif product_count == 4:
+        return "2x2 (four products in a square grid)"
+    elif product_count == 5:
+        return "flexible 2x3 or 3x2 with one larger product"
+    elif product_count == 6:
+        return "2x3 or 3x2 (six products in rectangular grid)"
+    elif product_count <= 8:
+        return "2x4 or 4x2 (eight products maximum)"
+    else:
+        return "3x3 or flexible grid (arrange efficiently)"
+
+
+def _field(product: Any, name: str) -> Any:
+    # Products are Product models (API) or plain dicts (leaflet requests)
+    return product.get(name) if isinstance(product, dict) else getattr(product, name, None)
+
+
+def page_sizes(product_count: int, max_per_page: int, strategy: str = "balanced") -> List[int]:
+    """Products per page, largest pages first.
+
+    "fixed" fills pages of max_per_page in order (the last one takes the rest). "balanced"
+    keeps the same, minimal, number of pages (so the same number of model calls) but spreads
+    the products evenly, preferring page sizes that fill a grid exactly when that costs at
+    most _MAX_GRID_SPREAD products of difference between pages.
+    """
+    max_per_page = max(1, max_per_page)
+    if product_count <= 0:
+        return []
+    if strategy == "fixed":
+        full, rest = divmod(product_count, max_per_page)
+        return [max_per_page] * full + ([rest] if rest else [])
+
+    pages = math.ceil(product_count / max_per_page)
+    small, extra = divmod(product_count, pages)
+    even = [small + 1] * extra + [small] * (pages - extra)
+    if all(size in FULL_GRID_SIZES for size in even):
+        return even
+
+    # Narrowest window [low, high] of full-grid sizes whose pages can add up to product_count
+    grid_sizes = sorted(size for size in FULL_GRID_SIZES if size <= max_per_page)
+    windows = sorted(
+        ((low, high) for low in grid_sizes for high in grid_sizes if low <= high and high - low <= _MAX_GRID_SPREAD),
+        key=lambda window: (window[1] - window[0], -window[1]),
+    )
+    for low, high in windows:
+        sizes = _fill(product_count, pages, [size for size in grid_sizes if low <= size <= high])
+        if sizes is not None:
+            return sizes
+    return even
+
+
+def _fill(total: int, pages: int, sizes: List[int]) -> Optional[List[int]]:
+    """`pages` values from `sizes` summing to `total` (largest first), or None"""
+    # reachable[k] is a bitset of the totals k pages can reach
+    reachable = [1]
+    for _ in range(pages):
+        bits = 0
+        for size in sizes:
+            bits |= reachable[-1] << size
+        reachable.append(bits)
+    if not reachable[pages] >> total & 1:
+        return None
+    result = []
+    for remaining_pages in range(pages, 0, -1):
+        for size in sorted(sizes, reverse=True):
+            if total >= size and reachable[remaining_pages - 1] >> (total - size) & 1:
+                result.append(size)
+                total -= size
+                break
+    return result
+
+
+def order_products(products: Sequence[Any], group_by: Optional[str] = None) -> List[Any]:
+    """Products in page order: as given, grouped by category (in order of first appearance),
+    or by price (cheapest first) so each page shows a similar price range"""
+    products = list(products)
+    if group_by == "category":
+        first_seen = {}
+        for product in products:
+            first_seen.setdefault(_field(product, "category") or "", len(first_seen))
+        return sorted(products, key=lambda product: first_seen[_field(product, "category") or ""])
+    if group_by == "price":
+        return sorted(products, key=lambda product: float(_field(product, "new_price") or 0))
+    return products
+
+
+def paginate(products: Sequence[Any], max_per_page: int, strategy: str = "balanced", group_by: Optional[str] = None,
+             model_calls: Optional[int] = None) -> Tuple[List[List[Any]], PaginationPlan]:
+    """Split products into pages and describe the split (products and grid layout per page).
+
+    model_calls defaults to one generation per page (pass 1 for composite rendering).
+    """
+    ordered = order_products(products, group_by)
+    pages, planned, start = [], [], 0
+    for number, size in enumerate(page_sizes(len(ordered), max_per_page, strategy), start=1):
+        pages.append(ordered[start:start + size])
+        start += size
+        planned.append(PlannedPage(
+            page=number,
+            product_count=size,
+            grid_layout=get_optimal_grid_layout(size),
+            products=[_field(product, "name") for product in pages[-1]],
+        ))
+    plan = PaginationPlan(
+        strategy=strategy,
+        group_by=group_by,
+        max_per_page=max(1, max_per_page),
+        model_calls=(len(pages) if model_calls is None else model_calls) if pages else 0,
+        pages=planned,
+    )
+    return pages, plan
@@ -0,0 +1,143 @@
+import logging
+import os
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from app.config import PDF_JPEG_QUALITY, PDF_DPI
+from app.services.image_workers import image_workers
+from app.services.metrics import track
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingPdfWriter:
+    """Minimal PDF writer that appends image pages one at a time.
+
+    Each page is embedded as a single JPEG (DCTDecode) image XObject and written to
+    the output immediately, so peak memory stays around one decoded page no matter
+    how many pages the document has. The page tree and cross-reference table are
+    written by close().
+
+        with StreamingPdfWriter("out.pdf") as pdf:
+            for page in pages:
+                pdf.add_page(page)
+    """
+
+    # Object 1 is the catalog and object 2 the page tree; both are written last
+    _CATALOG = 1
+    _PAGES = 2
+
+    def __init__(self, output: Union[str, BinaryIO], jpeg_quality: int = PDF_JPEG_QUALITY, dpi: int = PDF_DPI):
+        self._owns_file = isinstance(output, str)
+        if self._owns_file:
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        self._file = open(output, "wb") if self._owns_file else output
+        self.path = output if self._owns_file else None
+        self.jpeg_quality = jpeg_quality
+        self.dpi = dpi
+        self._offsets = {}
+        self._next_id = 3
+        self._page_ids: List[int] = []
+        self._position = 0
+        self._closed = False
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    @track("pdf_page")
+    def add_page(self, page: Union[Image.Image, bytes]):
+        """Append a page from a PIL image or encoded image bytes (PNG, JPEG, ...)"""
+        jpeg, size, colour_space = self._encode(page)
+        width_pt = size[0] * 72.0 / self.dpi
+        height_pt = size[1] * 72.0 / self.dpi
+
+        image_id = self._write_object(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s "
+            b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n"
+            % (size[0], size[1], colour_space, len(jpeg)) + jpeg + b"\nendstream"
+        )
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width_pt, height_pt)
+        content_id = self._write_object(
+            b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream"
+        )
+        page_id = self._write_object(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+            % (self._PAGES, width_pt, height_pt, image_id, content_id)
+        )
+        self._page_ids.append(page_id)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        self._write_object(
+            b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)), self._PAGES
+        )
+        self._write_object(b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES, self._CATALOG)
+
+        xref_position = self._position
+        object_count = self._next_id
+        lines = [b"xref\n0 %d\n" % object_count, b"0000000000 65535 f \n"]
+        lines.extend(b"%010d 00000 n \n" % self._offsets[obj_id] for obj_id in range(1, object_count))
+        self._write(b"".join(lines))
+        self._write(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (object_count, self._CATALOG, xref_position)
+        )
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._owns_file:
+            self._file.close()
+
+    def _encode(self, page: Union[Image.Image, bytes]):
+        if isinstance(page, bytes):
+            # Already a baseline-compatible JPEG in a PDF colour space: embed as is
+            if page.startswith(b"\xff\xd8"):
+                with Image.open(BytesIO(page)) as probe:
+                    if probe.mode in ("RGB", "L"):
+                        return page, probe.size, b"DeviceRGB" if probe.mode == "RGB" else b"DeviceGray"
+            # PNG / WebP pages are decoded and re-encoded in the image worker pool
+            return image_workers.run(encode_page, page, self.jpeg_quality)
+        return _encode_image(page, self.jpeg_quality)
+
+    def _write_object(self, body: bytes, obj_id: Optional[int] = None) -> int:
+        if obj_id is None:
+            obj_id = self._next_id
+            self._next_id += 1
+        self._offsets[obj_id] = self._position
+        self._write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+        return obj_id
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._position += len(data)
+
+
+def encode_page(data: bytes, jpeg_quality: int) -> Tuple[bytes, Tuple[int, int], bytes]:
+    """Image worker task: (JPEG bytes, size, PDF colour space) of an encoded page image"""
+    with Image.open(BytesIO(data)) as image:
+        return _encode_image(image, jpeg_quality)
+
+
+def _encode_image(image: Image.Image, jpeg_quality: int) -> Tuple[bytes, Tuple[int, int], bytes]:
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=jpeg_quality, optimize=True)
+    colour_space = b"DeviceRGB" if image.mode == "RGB" else b"DeviceGray"
+    return buffer.getvalue(), image.size, colour_space
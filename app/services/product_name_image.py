@@ -1,21 +1,37 @@
 import os
-from google import genai
-from google.genai.errors import ClientError
-from app.config import PRODUCT_DIR, GEMINI_API_KEY
+import re
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
 
+from app.config import PRODUCT_DIR, GEMINI_IMAGE_MODEL, SYNTHESIZED_PRODUCT_DIR, PRODUCT_IMAGE_CONCURRENCY
+from app.services.gemini_gateway import gemini
+from app.services.metrics import register_stats, track
+from app.services.asset_store import asset_store
+from app.services.index_file import index_lock, read_index, write_index
+from app.services.storage import get_storage
 
-# Initialize Gemini client
-client = genai.Client(api_key=GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
 
-def generate_product_image(product_name: str, save_path: str = None) -> str:
+
+def normalize_product_name(product_name: str) -> str:
+    """Case- and whitespace-insensitive identity of a product name"""
+    return re.sub(r"\s+", " ", product_name).strip().lower()
+
+
+@track("product_image")
+def _synthesize(product_name: str) -> bytes:
     prompt = (
         f"High-quality supermarket product photo of {product_name}, "
         "fresh and realistic, transparent background, professional studio lighting, "
         "sharp details, vibrant colors, centered composition, 4k resolution"
     )
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash-image-preview",
+    response = gemini.generate_content(
+        model=GEMINI_IMAGE_MODEL,
         contents=prompt
     )
 
@@ -23,7 +39,7 @@ def generate_product_image(product_name: str, save_path: str = None) -> str:
     try:
         if not response.candidates or not response.candidates[0].content.parts:
             raise RuntimeError("No image parts returned by Gemini API")
-        
+
         # Loop through parts to find inline_data (image)
         image_bytes = None
         for part in response.candidates[0].content.parts:
@@ -37,17 +53,189 @@ def generate_product_image(product_name: str, save_path: str = None) -> str:
     except Exception as e:
         raise RuntimeError(f"Could not extract image from response: {e}")
 
-    # Prepare save path
-    if save_path is None:
-        safe_name = product_name.replace(" ", "_").lower()
-        save_path = os.path.join(PRODUCT_DIR, f"{safe_name}.png")
-    else:
-        save_path = os.path.join(PRODUCT_DIR, save_path)
+    return image_bytes
+
+
+class ProductImageLibrary:
+    """Synthesized product photos, generated once per normalized product name.
+
+    Images are kept in the asset store; `directory` holds a persistent index.json
+    (name -> asset path, digest, public URL). An image is only uploaded to storage by
+    publish(), on its first /product-images request: the flyer fallback reads the local
+    file. Concurrent requests for the same product share one Gemini call, and
+    batches generate their missing products in parallel. Worker processes share the
+    index: each save merges it with the copy on disk under a file lock.
+    """
+
+    def __init__(self, directory: str, max_workers: int):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="product-image")
+        self._index: Optional[Dict[str, dict]] = None
+        # name -> image path of entries dropped here since the last save, removed from the shared index on save
+        self._removed: Dict[str, str] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "generated": 0, "deduplicated": 0, "failures": 0}
+
+    def get(self, product_name: str) -> Optional[dict]:
+        """Index entry of an already synthesized product, if its file is still there"""
+        with self._lock:
+            return self._entry(normalize_product_name(product_name))
+
+    def generate(self, product_name: str) -> dict:
+        """Return the product's entry, synthesizing the image if needed"""
+        return self.submit(product_name).result()
+
+    def submit(self, product_name: str) -> Future:
+        """Future of the product's entry (cached, in flight, or newly scheduled)"""
+        key = normalize_product_name(product_name)
+        if not key:
+            raise ValueError("Product name cannot be empty")
+        with self._lock:
+            entry = self._entry(key)
+            if entry is not None:
+                self._stats["hits"] += 1
+                future: Future = Future()
+                future.set_result({**entry, "cached": True})
+                return future
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["deduplicated"] += 1
+                return future
+            future = self._executor.submit(self._generate, key, product_name)
+            self._in_flight[key] = future
+        return future
+
+    def generate_many(self, product_names: List[str]) -> Dict[str, dict]:
+        """Entries for many products keyed by normalized name; duplicates are generated once"""
+        futures = {}
+        for product_name in product_names:
+            key = normalize_product_name(product_name)
+            if key and key not in futures:
+                futures[key] = self.submit(product_name)
+        return {key: future.result() for key, future in futures.items()}
 
-    # Save image
-    with open(save_path, "wb") as f:
-        f.write(image_bytes)
+    @staticmethod
+    def read_bytes(entry: dict) -> bytes:
+        """Encoded image of an entry, to stand in for a downloaded one"""
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._load_index()), "in_flight": len(self._in_flight)}
+
+    def _generate(self, key: str, product_name: str) -> dict:
+        try:
+            data = _synthesize(product_name)
+            digest = hashlib.sha256(data).hexdigest()
+            path = asset_store.put(data, "synthesized-product", name=key)
+
+            entry = {
+                "name": key,
+                "path": path,
+                "digest": digest,
+                "url": None,
+                "model": GEMINI_IMAGE_MODEL,
+                "created_at": time.time(),
+            }
+            with self._lock:
+                self._load_index()[key] = entry
+                self._save_index()
+                self._stats["generated"] += 1
+            logger.info(f"Synthesized product image for '{key}'")
+            return {**entry, "cached": False}
+        except Exception:
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def publish(self, entry: dict) -> Optional[str]:
+        """Upload the image to storage once, on first request, and remember its URL (failures leave it unpublished)"""
+        if entry.get("url") is None:
+            try:
+                with open(entry["path"], "rb") as f:
+                    entry["url"] = get_storage().put(f.read(), "image")
+            except Exception as e:
+                logger.warning(f"Could not publish product image '{entry['name']}': {e}")
+                return None
+            with self._lock:
+                if entry["name"] in self._load_index():
+                    self._index[entry["name"]]["url"] = entry["url"]
+                    self._save_index()
+        return entry["url"]
+
+    def _entry(self, key: str) -> Optional[dict]:
+        # Caller holds the lock
+        entry = self._load_index().get(key)
+        if entry is None:
+            # Possibly synthesized by another worker process since our last save
+            entry = self._refresh().get(key)
+        if entry is not None and not os.path.exists(entry["path"]):
+            self._index.pop(key)
+            self._removed[key] = entry["path"]
+            self._save_index()
+            return None
+        return entry
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            self._index = read_index(self.index_path)
+        return self._index
+
+    def _refresh(self) -> Dict[str, dict]:
+        """Pick up entries other processes saved (read only, our own entries win)"""
+        index = self._load_index()
+        for key, entry in read_index(self.index_path).items():
+            if key not in index and self._removed.get(key) != entry["path"]:
+                index[key] = entry
+        return index
+
+    def _save_index(self):
+        """Merge with the index on disk and write it back, under the file lock"""
+        with index_lock(self.index_path):
+            merged = read_index(self.index_path)
+            for key, path in self._removed.items():
+                if merged.get(key, {}).get("path") == path:
+                    del merged[key]
+            for key, entry in self._load_index().items():
+                other = merged.get(key)
+                if other is None:
+                    # Unknown on disk: new here, or dropped by another process (then its file is gone)
+                    if os.path.exists(entry["path"]):
+                        merged[key] = entry
+                elif entry["created_at"] > other["created_at"]:
+                    merged[key] = entry
+                elif entry["created_at"] == other["created_at"]:
+                    # Same image: keep the URL whichever process published it
+                    merged[key] = {**entry, "url": entry.get("url") or other.get("url")}
+            self._index = merged
+            self._removed = {}
+            write_index(self.index_path, self._index)
+
+product_images = ProductImageLibrary(SYNTHESIZED_PRODUCT_DIR, max_workers=PRODUCT_IMAGE_CONCURRENCY)
+
+register_stats(
+    "flyer_product_images", product_images.stats, "Synthesized product image library",
+    counters=("hits", "generated", "deduplicated", "failures"),
+)
+
+
+def generate_product_image(product_name: str, save_path: str = None) -> str:
+    """Return a local path to a synthesized photo of the product (reused when already generated)"""
+    entry = product_images.generate(product_name)
+    if save_path is None:
+        return entry["path"]
 
+    # Copy to the requested name under PRODUCT_DIR
+    save_path = os.path.join(PRODUCT_DIR, save_path)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    with open(entry["path"], "rb") as src, open(save_path, "wb") as dst:
+        dst.write(src.read())
     return save_path
 
 # Example usage
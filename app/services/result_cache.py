@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional
+
+from app.config import RESULT_CACHE_DIR, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES
+from app.services.image_preprocess import PreparedImage
+from app.services.metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Size-bounded local store of generated page images, keyed on everything that
+    determines a Gemini page call: model, rendered prompt and input image digests.
+
+    Each entry is a directory <key>/ holding the returned images as 0.bin, 1.bin, ...
+    The images are written once, so their mtime is the creation time the TTL counts
+    from; the directory mtime is bumped on every hit and only orders LRU eviction.
+    """
+
+    def __init__(self, cache_dir: str, ttl: float, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, prompt: str, images: List[PreparedImage]) -> str:
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        for image in images:
+            digest.update(b"\0")
+            digest.update(image.digest.encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        entry_dir = os.path.join(self.cache_dir, key)
+        with self._lock:
+            try:
+                if time.time() - _created_at(entry_dir) > self.ttl:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    raise FileNotFoundError(entry_dir)
+                names = sorted(os.listdir(entry_dir), key=lambda name: int(name.split(".")[0]))
+                results = []
+                for name in names:
+                    with open(os.path.join(entry_dir, name), "rb") as f:
+                        results.append(f.read())
+                # Last access, for LRU eviction only (a hot entry still expires after ttl)
+                os.utime(entry_dir)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+        logger.info(f"Result cache hit {key[:12]} ({len(results)} image(s))")
+        return results
+
+    def put(self, key: str, results: List[bytes]):
+        if not results:
+            return
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for i, data in enumerate(results):
+            with open(os.path.join(tmp_dir, f"{i}.bin"), "wb") as f:
+                f.write(data)
+        with self._lock:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp") or not os.path.isdir(path):
+                continue
+            try:
+                expired = now - _created_at(path) > self.ttl
+                accessed = os.path.getmtime(path)
+            except OSError:
+                # Removed meanwhile, or left without images
+                expired, accessed = True, 0.0
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((accessed, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _created_at(entry_dir: str) -> float:
+    return os.path.getmtime(os.path.join(entry_dir, "0.bin"))
+
+
+result_cache = ResultCache(RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL, max_bytes=RESULT_CACHE_MAX_BYTES)
+
+register_stats("flyer_result_cache", result_cache.stats, "Generated page cache", counters=("hits", "misses"))
@@ -1,25 +1,27 @@
 import os
 import base64
-import requests
 from fastapi import HTTPException
-from app.config import LOGO_DIR, PRODUCT_DIR
+from app.config import DOWNLOAD_MAX_BYTES, IMAGE_CACHE_FRESH_SECONDS
+from app.services.asset_store import asset_store
+from app.services.image_cache import image_cache
+from app.services.image_limits import ImageTooLarge, check_bytes, probe
 
-os.makedirs(LOGO_DIR, exist_ok=True)
-os.makedirs(PRODUCT_DIR, exist_ok=True)
 
-
-def _save_base64_image(base64_str: str, file_path: str):
+def _decode_base64_image(base64_str: str) -> bytes:
     try:
         mime_type, data = base64_str.split(",", 1)
+        # Base64 carries 3 bytes per 4 characters: refuse oversized payloads before decoding them
+        check_bytes(len(data) * 3 // 4, "data URI", DOWNLOAD_MAX_BYTES)
         image_data = base64.b64decode(data)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        return file_path
+        probe(image_data, "data URI")
+        return image_data
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to decode Base64 image: {str(e)}")
 
 
-def _save_from_url(url: str, file_path: str):
+def _fetch_from_url(url: str) -> bytes:
     try:
         # Handle Google Drive share links
         if "drive.google.com" in url:
@@ -30,53 +32,51 @@ def _save_from_url(url: str, file_path: str):
 
         # TODO: Add similar logic for OneDrive if needed
 
-        response = requests.get(url, timeout=15, stream=True)
-        response.raise_for_status()
-        with open(file_path, "wb") as f:
-            for chunk in response.iter_content(1024):
-                f.write(chunk)
-        return file_path
+        # Fresh bytes come from the image cache, stale ones are revalidated: a changed image is picked up
+        data = image_cache.fetch_bytes(url, timeout=15)
+        probe(data, url)
+        return data
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to download image: {str(e)}")
 
 
-def _save_from_local(local_path: str, file_path: str):
+def _read_local(local_path: str) -> bytes:
     if not os.path.exists(local_path):
         raise HTTPException(status_code=422, detail=f"Local file does not exist: {local_path}")
     try:
-        with open(local_path, "rb") as src, open(file_path, "wb") as dst:
-            dst.write(src.read())
-        return file_path
+        with open(local_path, "rb") as src:
+            return src.read()
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to copy local file: {str(e)}")
 
 
-def _download_image(name: str, url: str, folder: str) -> str:
+def _download_image(name: str, url: str, namespace: str) -> str:
+    """Local path of the image, stored by content in the asset store (the source URL recorded as a ref)"""
     if not name:
         raise HTTPException(status_code=422, detail="Name cannot be empty")
     if not url:
         raise HTTPException(status_code=422, detail="Image URL is required")
 
-    safe_name = name.lower().replace(" ", "_")
-    file_path = os.path.join(folder, f"{safe_name}.png")
-
-    if os.path.exists(file_path):
-        return file_path
-
     if url.startswith("data:image/"):
-        return _save_base64_image(url, file_path)
+        return asset_store.put(_decode_base64_image(url), namespace, name=name)
     elif url.startswith("http://") or url.startswith("https://"):
-        return _save_from_url(url, file_path)
+        # Fetched within the image cache's freshness window: reuse the stored blob without hashing it again
+        path = asset_store.lookup(namespace, url, max_age=IMAGE_CACHE_FRESH_SECONDS)
+        if path is not None:
+            return path
+        return asset_store.put(_fetch_from_url(url), namespace, name=name, url=url)
     else:  # treat as local path
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
         local_path = os.path.join(project_root, url.lstrip("./").lstrip("/"))
-        return _save_from_local(local_path, file_path)
+        return asset_store.put(_read_local(local_path), namespace, name=name)
 
 # Public APIs
 def download_image_by_logo(supermarket_name: str, supermarket_logo_url: str) -> str:
-    return _download_image(supermarket_name, supermarket_logo_url, LOGO_DIR)
+    return _download_image(supermarket_name, supermarket_logo_url, "logo")
 
 
 def download_image_by_product(product_name: str, product_url: str) -> str:
-    return _download_image(product_name, product_url, PRODUCT_DIR)
+    return _download_image(product_name, product_url, "product")
 
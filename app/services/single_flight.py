@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one execution.
+
+    The first caller (the leader) runs the function; callers arriving while it runs wait
+    for it and get the same result or exception. Successful results are kept for `ttl`
+    seconds (at most `max_results` of them) so late duplicates are answered without
+    running again; failures are never kept.
+    """
+
+    def __init__(self, name: str, ttl: float = 0.0, max_results: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.max_results = max_results
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._recent: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"executed": 0, "coalesced": 0, "recent_hits": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, share_recent: bool = True, **kwargs):
+        """fn(*args, **kwargs), unless an identical call (same key) is running or just finished.
+
+        share_recent=False still joins a running call but ignores kept results.
+        """
+        with self._lock:
+            if share_recent and key in self._recent:
+                expires, result = self._recent[key]
+                if expires > time.monotonic():
+                    self._stats["recent_hits"] += 1
+                    return result
+                del self._recent[key]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self._stats["executed"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            logger.info(f"Joined in-flight {self.name} call {str(key)[:12]}")
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            if self.ttl > 0:
+                self._recent[key] = (time.monotonic() + self.ttl, result)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_results:
+                    self._recent.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._in_flight), "recent": len(self._recent)}
@@ -0,0 +1,277 @@
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from app.config import STORAGE_BACKEND, OUTPUTS_DIR, STORAGE_PUBLIC_BASE_URL, UPLOAD_CONCURRENCY, UPLOAD_TIMEOUT
+from app.services.artifacts import FlyerArtifact
+
+logger = logging.getLogger(__name__)
+
+# Encoded bytes, a local file path or a readable binary stream
+Payload = Union[bytes, str, BinaryIO]
+
+_EXTENSIONS = {"pdf": "pdf"}
+
+
+class Storage(ABC):
+    """Where generated pages and PDFs are published.
+
+    kind is "image" or "pdf". put() returns the public URL; when no key is given,
+    backends pick a fresh one, so deleting an upload never takes down another one
+    with the same content. A backend missing put, url or delete fails when created.
+    """
+
+    name = "base"
+    # Exceptions that retrying the same put will not fix
+    non_retryable: Tuple[type, ...] = ()
+
+    @abstractmethod
+    def put(self, data: Payload, kind: str = "image", key: Optional[str] = None) -> str:
+        """Publish data and return its public URL"""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Public URL of a stored object"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a stored object (no error if it is already gone)"""
+
+    def key_of(self, url: str) -> str:
+        """Key of an object from the URL put() returned"""
+        return url.rsplit("/", 1)[-1]
+
+    def put_many(self, items: List[Payload], kind: str = "image") -> List[str]:
+        return [self.put(data, kind) for data in items]
+
+    def warm_up(self):
+        """Open connections ahead of the first put (no-op unless the backend is remote)"""
+
+
+def _read(data: Payload) -> bytes:
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        with open(data, "rb") as f:
+            return f.read()
+    return data.read()
+
+
+def _default_key(data: bytes, kind: str) -> str:
+    extension = _EXTENSIONS.get(kind) or FlyerArtifact(data).extension
+    return f"{uuid.uuid4().hex}.{extension}"
+
+
+def _default_file_key(path: str, kind: str) -> str:
+    extension = _EXTENSIONS.get(kind) or os.path.splitext(path)[1].lstrip(".") or "bin"
+    return f"{uuid.uuid4().hex}.{extension}"
+
+
+class LocalStorage(Storage):
+    """Files under a local directory, served by the app's /outputs static mount"""
+
+    name = "local"
+    non_retryable = (FileNotFoundError, PermissionError)
+
+    def __init__(self, root: str, base_url: str, prefix: str = "published"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.prefix = prefix
+
+    def put(self, data: Payload, kind: str = "image", key: Optional[str] = None) -> str:
+        if isinstance(data, str):
+            key = key or _default_file_key(data, kind)
+        else:
+            data = _read(data)
+            key = key or _default_key(data, kind)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if isinstance(data, str):
+            shutil.copyfile(data, tmp_path)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{self.prefix}/{key}"
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, self.prefix, os.path.basename(key))
+
+
+class MemoryStorage(Storage):
+    """Keeps everything in a dict; for offline runs and benchmarks.
+
+    URLs use the reserved .invalid domain: valid http URLs that never resolve.
+    """
+
+    name = "memory"
+
+    def __init__(self, base_url: str = "http://storage.invalid"):
+        self.base_url = base_url.rstrip("/")
+        self.objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, data: Payload, kind: str = "image", key: Optional[str] = None) -> str:
+        data = _read(data)
+        key = key or _default_key(data, kind)
+        with self._lock:
+            self.objects[key] = data
+        return self.url(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self.objects.get(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def delete(self, key: str):
+        with self._lock:
+            self.objects.pop(key, None)
+
+
+class CloudinaryStorage(Storage):
+    """Public Cloudinary uploads; keys are Cloudinary public ids.
+
+    Requests go to the Upload API through a pooled requests session sized to the upload
+    pool, so concurrent uploads reuse keep-alive connections instead of queueing on the
+    SDK's single-connection pool. The SDK only signs requests and builds URLs.
+    """
+
+    name = "cloudinary"
+
+    def __init__(self):
+        import cloudinary
+        import cloudinary.exceptions
+        import cloudinary.utils
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        cloudinary.config(
+            cloud_name=os.getenv("CLOUD_NAME"),
+            api_key=os.getenv("API_KEY"),
+            api_secret=os.getenv("API_SECRET")
+        )
+        self._config = cloudinary.config()
+        self._utils = cloudinary.utils
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=UPLOAD_CONCURRENCY))
+        errors = cloudinary.exceptions
+        # Upload API status codes, raised as the SDK would
+        self._errors = {
+            400: errors.BadRequest,
+            401: errors.AuthorizationRequired,
+            403: errors.NotAllowed,
+            404: errors.NotFound,
+            409: errors.AlreadyExists,
+            420: errors.RateLimited,
+            500: errors.GeneralError,
+        }
+        self._error = errors.Error
+        self.non_retryable = (
+            errors.BadRequest,
+            errors.AuthorizationRequired,
+            errors.NotAllowed,
+            errors.NotFound,
+            errors.AlreadyExists,
+        )
+
+    def warm_up(self):
+        # Any response will do: it leaves a TLS connection in the upload pool
+        self._session.head("https://api.cloudinary.com/", timeout=5)
+
+    def put(self, data: Payload, kind: str = "image", key: Optional[str] = None) -> str:
+        params = {"type": "upload"}  # public delivery (no expiry)
+        if key is not None:
+            params["public_id"] = key
+        resource_type = self._resource_type(kind)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                return self._call("upload", resource_type, params, (os.path.basename(data), f))["secure_url"]
+        return self._call("upload", resource_type, params, ("file", data))["secure_url"]
+
+    def url(self, key: str) -> str:
+        return self._utils.cloudinary_url(key, resource_type=self._resource_type_of(key), secure=True)[0]
+
+    def delete(self, key: str):
+        self._call("destroy", self._resource_type_of(key), {"public_id": key, "type": "upload"})
+
+    def key_of(self, url: str) -> str:
+        # .../<resource_type>/upload/v<version>/<public id>; image URLs add the format, raw ids keep their extension
+        prefix, path = url.split("/upload/", 1)
+        path = re.sub(r"^v\d+/", "", path)
+        return os.path.splitext(path)[0] if prefix.endswith("/image") else path
+
+    def _call(self, action: str, resource_type: str, params: dict, file: Optional[tuple] = None) -> dict:
+        params = {**params, "timestamp": str(int(time.time()))}
+        params["signature"] = self._utils.api_sign_request(
+            params, self._config.api_secret, self._config.signature_algorithm or self._utils.SIGNATURE_SHA1
+        )
+        params["api_key"] = self._config.api_key
+        response = self._session.post(
+            self._utils.cloudinary_api_url(action, resource_type=resource_type),
+            data=params, files={"file": file} if file is not None else None, timeout=UPLOAD_TIMEOUT,
+        )
+        try:
+            result = response.json()
+        except ValueError:
+            raise self._error(f"Error parsing Cloudinary response ({response.status_code}): {response.text[:200]}")
+        if "error" in result:
+            raise self._errors.get(response.status_code, self._error)(result["error"]["message"])
+        return result
+
+    @staticmethod
+    def _resource_type(kind: str) -> str:
+        # PDFs (and any other non-image file) go up as raw resources
+        return "image" if kind == "image" else "raw"
+
+    def _resource_type_of(self, key: str) -> str:
+        return self._resource_type("pdf" if key.lower().endswith(".pdf") else "image")
+
+
+_BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": lambda: LocalStorage(OUTPUTS_DIR, STORAGE_PUBLIC_BASE_URL),
+    "memory": MemoryStorage,
+}
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """Return the process-wide storage backend selected by STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                factory = _BACKENDS.get(STORAGE_BACKEND)
+                if factory is None:
+                    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}, expected one of {sorted(_BACKENDS)}")
+                _storage = factory()
+                logger.info(f"Using {_storage.name} storage")
+    return _storage
+
+
+def set_storage(storage: Storage):
+    """Swap the storage backend (e.g. a MemoryStorage for an offline run)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
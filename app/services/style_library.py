@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from typing import Dict, Optional
+
+from PIL import Image
+
+from app.config import STYLE_LIBRARY_DIR, STYLE_LIBRARY_MAX_ENTRIES, STYLE_LIBRARY_MAX_AGE
+from app.services.artifacts import FlyerArtifact
+from app.services.image_preprocess import PreparedImage
+from app.services.index_file import index_lock, read_index, write_index
+from app.services.metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Optional[str]) -> str:
+    return re.sub(r"\s+", " ", value or "").strip().casefold()
+
+
+class StyleLibrary:
+    """Style-setting images (AI reference pages, composite backgrounds, leaflet backgrounds)
+    kept per theme, campaign occasion and store branding.
+
+    The first generation of a campaign only fixes its look, so a later campaign with the
+    same attributes can opt in to reuse it and skip that serial model call. Images live in
+    `directory` next to a persistent index.json; entries older than max_age are dropped and,
+    past max_entries, the least recently used go first. Worker processes share the index:
+    each save merges it with the copy on disk under a file lock, like the image cache.
+    """
+
+    def __init__(self, directory: str, max_entries: int, max_age: float):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._index: Optional[Dict[str, dict]] = None
+        # key -> image path of entries removed here since the last save, removed from the shared index on save
+        self._removed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def key(kind: str, theme_style: str, why_this_campaign: str, supermarket_name: str, logo_digest: str) -> str:
+        """Identity of a style: kind ("reference", "background", "leaflet"), normalized theme
+        attributes and branding (store name and logo)"""
+        digest = hashlib.sha256()
+        for part in (kind, _normalize(theme_style), _normalize(why_this_campaign), _normalize(supermarket_name), logo_digest):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is None:
+                # Possibly stored by another worker process since our last save
+                entry = self._refresh().get(key)
+            data = None
+            if entry is not None and time.time() - entry["created_at"] <= self.max_age:
+                try:
+                    with open(entry["path"], "rb") as f:
+                        data = f.read()
+                except OSError:
+                    pass
+            if data is None:
+                if entry is not None:
+                    self._remove(key)
+                    self._save_index()
+                self._stats["misses"] += 1
+                return None
+            entry["last_used"] = time.time()
+            self._save_index()
+            self._stats["hits"] += 1
+        logger.info(f"Reusing stored {entry['kind']} style {key[:12]}")
+        return data
+
+    def reference(self, key: str) -> Optional[PreparedImage]:
+        """A stored reference page, ready to pass to the model"""
+        data = self.get(key)
+        if data is None:
+            return None
+        with Image.open(BytesIO(data)) as image:
+            # Header only, the pixels are not decoded
+            size, mime_type = image.size, Image.MIME[image.format]
+        return PreparedImage(data, mime_type, size, hashlib.sha256(data).hexdigest())
+
+    def background(self, key: str) -> Optional[FlyerArtifact]:
+        """A stored composite background"""
+        data = self.get(key)
+        return FlyerArtifact(data, metadata={"index": 0, "page": 0, "reused": True}) if data is not None else None
+
+    def put(self, key: str, data: bytes, kind: str, **attributes):
+        """Store (or replace) a style image; failures are logged, never raised"""
+        try:
+            # A file per stored image: replacing a key never touches a file another process still indexes
+            path = os.path.join(self.directory, f"{key}-{uuid.uuid4().hex[:8]}.bin")
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            now = time.time()
+            with self._lock:
+                self._load_index()[key] = {"kind": kind, "path": path, "created_at": now, "last_used": now, **attributes}
+                self._stats["stored"] += 1
+                self._save_index()
+        except Exception as e:
+            logger.warning(f"Could not store {kind} style {key[:12]}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._load_index())}
+
+    def _evict(self):
+        # Caller holds the file lock, so self._index is the merged index of every process
+        now = time.time()
+        for key, entry in list(self._index.items()):
+            if now - entry["created_at"] > self.max_age:
+                self._remove(key)
+        overflow = len(self._index) - self.max_entries
+        if overflow > 0:
+            for key, _ in sorted(self._index.items(), key=lambda item: item[1]["last_used"])[:overflow]:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        # Caller holds the lock
+        entry = self._index.pop(key)
+        self._removed[key] = entry["path"]
+        self._stats["evicted"] += 1
+        _delete(entry["path"])
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            self._index = read_index(self.index_path)
+        return self._index
+
+    def _refresh(self) -> Dict[str, dict]:
+        """Pick up entries other processes saved (read only, our own entries win)"""
+        index = self._load_index()
+        for key, entry in read_index(self.index_path).items():
+            if key not in index and self._removed.get(key) != entry["path"]:
+                index[key] = entry
+        return index
+
+    def _save_index(self):
+        """Merge with the index on disk, evict and write it back, all under the file lock"""
+        with index_lock(self.index_path):
+            merged = read_index(self.index_path)
+            for key, path in self._removed.items():
+                if merged.get(key, {}).get("path") == path:
+                    del merged[key]
+            for key, entry in self._load_index().items():
+                other = merged.get(key)
+                if other is None:
+                    # Unknown on disk: new here, or removed by another process (then its file is gone)
+                    if os.path.exists(entry["path"]):
+                        merged[key] = entry
+                elif other["path"] == entry["path"]:
+                    merged[key] = {**entry, "last_used": max(entry["last_used"], other["last_used"])}
+                else:
+                    # Stored by two processes: the newer image wins and the other file goes
+                    newer, older = (entry, other) if entry["created_at"] >= other["created_at"] else (other, entry)
+                    merged[key] = newer
+                    _delete(older["path"])
+            self._index = merged
+            self._evict()
+            self._removed = {}
+            write_index(self.index_path, self._index)
+
+
+def _delete(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+style_library = StyleLibrary(STYLE_LIBRARY_DIR, max_entries=STYLE_LIBRARY_MAX_ENTRIES, max_age=STYLE_LIBRARY_MAX_AGE)
+
+register_stats(
+    "flyer_style_library", style_library.stats, "Reusable theme backgrounds and reference pages",
+    counters=("hits", "misses", "stored", "evicted"),
+)
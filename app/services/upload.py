@@ -1,37 +1,73 @@
-import os
-from dotenv import load_dotenv
-import cloudinary
-import cloudinary.uploader
+import logging
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Union
 
-# Load .env file
-load_dotenv()
+from app.config import UPLOAD_CONCURRENCY, UPLOAD_MAX_RETRIES
+from app.services.metrics import RETRIES, track
+from app.services.storage import get_storage
 
-# Config from env
-cloudinary.config( 
-    cloud_name = os.getenv("CLOUD_NAME"),
-    api_key = os.getenv("API_KEY"),
-    api_secret = os.getenv("API_SECRET")
-)
+logger = logging.getLogger(__name__)
+
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload")
+
+
+def _with_retries(upload_fn, file: Union[str, bytes]) -> str:
+    """Run an upload, retrying transient failures with jittered exponential backoff.
+
+    Only bytes and file paths are retried: a stream is consumed by the first attempt.
+    """
+    max_retries = UPLOAD_MAX_RETRIES if isinstance(file, (bytes, str)) else 0
+    for attempt in range(max_retries + 1):
+        try:
+            return upload_fn(file)
+        except get_storage().non_retryable:
+            raise
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, 2 ** attempt)
+            RETRIES.labels(stage="upload").inc()
+            logger.warning(f"Upload failed ({e}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
 
 # Upload image function
-def upload_image(file_path: str) -> str:
-    """Uploads an image to Cloudinary and returns the secure URL."""
-    result = cloudinary.uploader.upload(
-        file_path,
-        resource_type="image",      # image files
-        type="upload"               # public by default
-    )
-    return result["secure_url"]
+@track("upload_image")
+def upload_image(file: Union[str, bytes]) -> str:
+    """Stores an image (file path or encoded bytes) in the configured storage and returns its public URL."""
+    return get_storage().put(file, "image")
 
 # Upload PDF (or any raw file)
-def upload_pdf(file_path: str) -> str:
-    """Uploads a PDF (or any raw file) to Cloudinary and returns a permanent public secure URL."""
-    result = cloudinary.uploader.upload(
-        file_path,
-        resource_type="raw",        # for pdf/docx/zip etc.
-        type="upload"               # public delivery (no expiry)
-    )
-    return result["secure_url"]
+@track("upload_pdf")
+def upload_pdf(file: Union[str, bytes]) -> str:
+    """Stores a PDF (or any raw file, path or bytes) in the configured storage and returns its public URL."""
+    return get_storage().put(file, "pdf")
+
+def upload_image_async(file: Union[str, bytes]) -> Future:
+    """Start an image upload on the shared upload pool; the Future resolves to the public URL."""
+    return _upload_executor.submit(_with_retries, upload_image, file)
+
+
+def upload_pdf_async(file: Union[str, bytes]) -> Future:
+    """Start a PDF upload on the shared upload pool; the Future resolves to the public URL."""
+    return _upload_executor.submit(_with_retries, upload_pdf, file)
+
+
+def discard_uploads(uploads: Iterable[Future]):
+    """Take down what these uploads published (queued ones are cancelled), e.g. the first pages
+    of a campaign that failed later on. Best effort: failures are logged, never raised."""
+    storage = get_storage()
+    for upload in uploads:
+        if upload.cancel() or upload.exception() is not None:
+            continue
+        url = upload.result()
+        try:
+            storage.delete(storage.key_of(url))
+            logger.info(f"Removed upload of failed campaign: {url}")
+        except Exception as e:
+            logger.warning(f"Could not remove upload {url}: {e}")
+
 
 # Example usage
 if __name__ == "__main__":
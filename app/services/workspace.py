@@ -0,0 +1,187 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from app.config import (
+    ARTIFACT_MAX_AGE, ARTIFACT_MAX_BYTES, ASSET_STORE_DIR, GENERATED_DIR, IMAGE_CACHE_DIR,
+    JANITOR_INTERVAL, OUTPUTS_DIR, RESULT_CACHE_DIR, STYLE_LIBRARY_DIR,
+)
+from app.services.metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Entries touched this recently are never removed to meet the size quota: another worker process may own them
+_QUOTA_GRACE_SECONDS = 600
+
+
+def _measure(path: str) -> Tuple[int, int, float]:
+    """(bytes, files, last modification) of a file or a whole folder"""
+    try:
+        if not os.path.isdir(path):
+            stat = os.stat(path)
+            return stat.st_size, 1, stat.st_mtime
+        total, files, latest = 0, 0, os.stat(path).st_mtime
+        for directory, _, names in os.walk(path):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                total, files, latest = total + stat.st_size, files + 1, max(latest, stat.st_mtime)
+        return total, files, latest
+    except OSError:
+        return 0, 0, 0.0
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class Workspace:
+    """Lifecycle of local working files: per-job scratch folders and leftovers in outputs/.
+
+    Each job (campaign, leaflet, PDF merge) writes into its own folder under `scratch_dir`,
+    removed when the job ends whether it succeeded or failed, so concurrent jobs never share
+    a path. A janitor thread sweeps what a crashed or killed process left behind: folders in
+    `scratch_dir` and top-level entries of `outputs_dir` (except `keep`, e.g. the local storage
+    backend's published files) older than max_age go, then the least recently modified ones
+    while the total is over max_bytes. Folders of jobs running in this process are skipped.
+    """
+
+    def __init__(self, scratch_dir: str, outputs_dir: str, max_bytes: int, max_age: float, interval: float,
+                 keep: Sequence[str] = ("published",), report: Optional[Dict[str, str]] = None):
+        self.scratch_dir = scratch_dir
+        self.outputs_dir = outputs_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.keep = set(keep)
+        self.report = report or {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._usage: Dict[str, int] = {}
+        self._stats = {"jobs": 0, "sweeps": 0, "removed": 0, "freed_bytes": 0}
+
+    @contextmanager
+    def job(self, label: str) -> Iterator[str]:
+        """A fresh scratch folder for one job, deleted on exit (success or failure)"""
+        path = os.path.join(self.scratch_dir, f"{label}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        with self._lock:
+            self._active.add(path)
+            self._stats["jobs"] += 1
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._active.discard(path)
+
+    def sweep(self) -> Dict[str, int]:
+        """Remove stale scratch folders and output leftovers; returns what was removed"""
+        entries = []
+        for root, skip in ((self.scratch_dir, ()), (self.outputs_dir, self.keep)):
+            try:
+                names = os.listdir(root)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                if name in skip or name.endswith(".tmp"):
+                    continue
+                size, _, modified = _measure(path)
+                entries.append((modified, size, path))
+
+        with self._lock:
+            active = set(self._active)
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for modified, size, path in sorted(entries):
+            stale = now - modified > self.max_age
+            over_quota = total > self.max_bytes and now - modified > _QUOTA_GRACE_SECONDS
+            if path in active or not (stale or over_quota):
+                continue
+            _remove(path)
+            total -= size
+            removed, freed = removed + 1, freed + size
+
+        with self._lock:
+            self._stats["sweeps"] += 1
+            self._stats["removed"] += removed
+            self._stats["freed_bytes"] += freed
+        if removed:
+            logger.info(f"Janitor removed {removed} stale artifact(s), {freed} bytes ({total} bytes left, quota {self.max_bytes})")
+        return {"removed": removed, "freed_bytes": freed}
+
+    def usage(self) -> Dict[str, dict]:
+        """Bytes and file counts per local storage area, plus free space on the temp volume"""
+        areas = {"scratch": self.scratch_dir, "outputs": self.outputs_dir, **self.report}
+        usage = {}
+        for name, path in areas.items():
+            size, files, _ = _measure(path)
+            usage[name] = {"path": path, "bytes": size, "files": files}
+        disk = shutil.disk_usage(self.scratch_dir if os.path.isdir(self.scratch_dir) else ".")
+        usage["disk"] = {"total_bytes": disk.total, "free_bytes": disk.free}
+        with self._lock:
+            self._usage = {f"{name}_bytes": area["bytes"] for name, area in usage.items() if "bytes" in area}
+            self._usage["disk_free_bytes"] = disk.free
+        return usage
+
+    def stats(self) -> Dict[str, int]:
+        """Janitor counters and the disk usage measured by the last sweep"""
+        with self._lock:
+            return {**self._stats, "active_jobs": len(self._active), **self._usage}
+
+    def start_janitor(self):
+        """Sweep now and then every `interval` seconds in a daemon thread (interval 0 disables it)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="artifact-janitor", daemon=True)
+        self._thread.start()
+
+    def stop_janitor(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+                self.usage()
+            except Exception as e:
+                logger.warning(f"Artifact janitor failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+workspace = Workspace(
+    GENERATED_DIR, OUTPUTS_DIR, max_bytes=ARTIFACT_MAX_BYTES, max_age=ARTIFACT_MAX_AGE, interval=JANITOR_INTERVAL,
+    report={
+        "image_cache": IMAGE_CACHE_DIR,
+        "result_cache": RESULT_CACHE_DIR,
+        "assets": ASSET_STORE_DIR,
+        "style_library": STYLE_LIBRARY_DIR,
+    },
+)
+
+register_stats(
+    "flyer_artifacts", workspace.stats, "Local working files: scratch jobs, janitor sweeps and disk usage",
+    counters=("jobs", "sweeps", "removed", "freed_bytes"),
+)
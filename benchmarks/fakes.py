@@ -0,0 +1,214 @@
+"""Local stand-ins for Gemini, the storage backend and product image hosting"""
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from google.genai import types
+from google.genai.errors import ClientError
+from PIL import Image
+
+from app.services.storage import Payload, Storage
+
+
+@lru_cache(maxsize=32)
+def render_image(size: Tuple[int, int], seed: int, fmt: str = "JPEG") -> bytes:
+    """A photo-like (noisy, so realistically sized) test image"""
+    rng = random.Random(seed)
+    base = Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    noise = Image.effect_noise(size, 48).convert("RGB")
+    image = Image.blend(base, noise, 0.35)
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, fmt, quality=85)
+    else:
+        image.save(buffer, fmt, compress_level=1)
+    return buffer.getvalue()
+
+
+class FakeGeminiClient:
+    """Drop-in for genai.Client: sleeps `latency` seconds and returns a PNG page.
+
+    `rate_limit_ratio` of calls fail with a 429 carrying a RetryInfo hint of
+    `retry_delay` seconds, like the real quota errors.
+    """
+
+    def __init__(self, latency: float = 1.0, image_size: Tuple[int, int] = (1024, 1280), rate_limit_ratio: float = 0.0, retry_delay: float = 1.0, variants: int = 4, seed: int = 0):
+        self.latency = latency
+        self.image_size = image_size
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_delay = retry_delay
+        self.models = self
+        self._pages = [render_image(image_size, seed + i, "PNG") for i in range(variants)]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.busy_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def generate_content(self, model: str, contents, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            throttle = self._random.random() < self.rate_limit_ratio
+            self.bytes_in += sum(self._size(item) for item in contents)
+
+        if throttle:
+            with self._lock:
+                self.rate_limited += 1
+            raise ClientError(429, {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{self.retry_delay}s"}],
+            }})
+
+        started = time.monotonic()
+        time.sleep(self.latency)
+        page = self._pages[call % len(self._pages)]
+        with self._lock:
+            self.busy_seconds += time.monotonic() - started
+            self.bytes_out += len(page)
+        return types.GenerateContentResponse(candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part.from_bytes(data=page, mime_type="image/png")])
+        )])
+
+    @staticmethod
+    def _size(item) -> int:
+        if isinstance(item, str):
+            return len(item.encode("utf-8"))
+        inline = getattr(item, "inline_data", None)
+        if inline is not None:
+            return len(inline.data)
+        if isinstance(item, Image.Image):
+            return len(item.tobytes())
+        return 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+
+class MeteredStorage(Storage):
+    """Wraps a storage backend, counting puts, bytes and time spent storing"""
+
+    def __init__(self, inner: Storage):
+        self.inner = inner
+        self.name = f"metered-{inner.name}"
+        self.non_retryable = inner.non_retryable
+        self._lock = threading.Lock()
+        self.puts = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def put(self, data: Payload, kind: str = "image", key: Optional[str] = None) -> str:
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        elif not isinstance(data, bytes):
+            data = data.read()
+        started = time.monotonic()
+        url = self.inner.put(data, kind, key)
+        with self._lock:
+            self.puts += 1
+            self.bytes += len(data)
+            self.seconds += time.monotonic() - started
+        return url
+
+    def url(self, key: str) -> str:
+        return self.inner.url(key)
+
+    def delete(self, key: str):
+        self.inner.delete(key)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"puts": self.puts, "bytes": self.bytes, "seconds": round(self.seconds, 3)}
+
+
+class ImageServer:
+    """Threaded local HTTP server for product and logo images.
+
+    /product/<n>.jpg serves image n % distinct, so repeated products can be modelled;
+    bytes_served counts everything sent.
+    """
+
+    def __init__(self, image_size: Tuple[int, int] = (800, 800), distinct: int = 50, latency: float = 0.0):
+        self.image_size = image_size
+        self.distinct = max(1, distinct)
+        self.latency = latency
+        self.bytes_served = 0
+        self.requests = 0
+        self._images: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-image-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def product_url(self, n: int) -> str:
+        return f"{self.base_url}/product/{n}.jpg"
+
+    def logo_url(self) -> str:
+        return f"{self.base_url}/logo.jpg"
+
+    def image(self, n: int) -> bytes:
+        n = n % self.distinct if n >= 0 else n
+        with self._lock:
+            if n not in self._images:
+                self._images[n] = render_image(self.image_size, 1000 + n)
+            return self._images[n]
+
+    def start(self) -> "ImageServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "bytes": self.bytes_served}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/logo.jpg":
+                    data = server.image(-1)
+                elif self.path.startswith("/product/"):
+                    data = server.image(int(self.path.rsplit("/", 1)[1].split(".")[0]))
+                else:
+                    self.send_error(404)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_served += len(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
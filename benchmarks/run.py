@@ -0,0 +1,366 @@
+"""End-to-end flyer pipeline benchmarks against local stand-ins.
+
+Every scenario runs in a fresh process (clean caches, honest peak RSS) with a fake
+Gemini client, a memory or local storage backend and a local image server:
+
+    python -m benchmarks.run --products 1,10,50,200 --per-page 4,8 --output bench.json
+
+Results are JSON: one record per scenario with wall time, per-stage time, peak RSS
+(including the image worker processes, also reported on their own) and bytes moved, plus the revision and parameters, so runs can be diffed.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+TARGETS = ("generate_flyers", "leaflet", "generate_pdf")
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process plus its child processes (the spawned image workers), in MB"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / _RUSAGE_UNIT
+    return round(peak + _workers_peak_rss_mb(), 1)
+
+
+def _workers_peak_rss_mb() -> float:
+    """Summed peak RSS of the child processes, in MB.
+
+    Decode and encode run in image worker processes that live as long as the scenario, so
+    live children are sampled: their high-water mark on Linux, current RSS elsewhere.
+    Children that already exited only report the largest peak among them (RUSAGE_CHILDREN).
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    total = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / _RUSAGE_UNIT
+    for pid in _child_pids():
+        total += _process_peak_mb(pid)
+    return round(total, 1)
+
+
+# ru_maxrss is KiB on Linux, bytes on macOS
+_RUSAGE_UNIT = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+
+def _child_pids() -> List[int]:
+    try:
+        import psutil
+        return [child.pid for child in psutil.Process().children(recursive=True)]
+    except ImportError:
+        pass
+    # Linux without psutil: children are the /proc entries whose parent is this process
+    pids = []
+    for name in os.listdir("/proc") if os.path.isdir("/proc") else ():
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == os.getpid():
+            pids.append(int(name))
+    return pids
+
+
+def _process_peak_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+class StageTimer:
+    """Progress callback that turns stage changes into per-stage durations"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._stage = None
+        self._since = time.monotonic()
+
+    def __call__(self, stage: str, **details):
+        if stage != "page_ready":
+            self.enter(stage)
+
+    def enter(self, stage: str):
+        now = time.monotonic()
+        if self._stage is not None and stage != self._stage:
+            self.stages[self._stage] = round(self.stages.get(self._stage, 0.0) + now - self._since, 3)
+        if stage != self._stage:
+            self._stage = stage
+            self._since = now
+
+    def finish(self) -> Dict[str, float]:
+        self.enter("done")
+        return self.stages
+
+
+def _products(server, count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": f"Product {n}",
+            "secondary_name": f"Pack {n}",
+            "old_price": 10.0 + n,
+            "new_price": 8.0 + n,
+            "discount": 2.0,
+            "currency": "USD",
+            "image_url": server.product_url(n),
+        }
+        for n in range(count)
+    ]
+
+
+def _campaign(server, count: int, per_page: int) -> Dict[str, Any]:
+    return {
+        "supermarket_name": "Bench Market",
+        "why_this_campaign": "Weekly offers",
+        "supermarket_address": "1 Benchmark Road",
+        "campaign_start_date": "2025-01-01",
+        "campaign_end_date": "2025-01-07",
+        "supermarket_logo_url": server.logo_url(),
+        "products": _products(server, count),
+        "products_per_page": per_page,
+        "template_instruction": "Grid",
+        "theme_style": "modern",
+        "use_cache": False,
+    }
+
+
+def _bench_generate_flyers(server, scenario, timer: StageTimer) -> Dict[str, Any]:
+    from app.routes.flyer import build_flyers
+    from app.schemas.Campaign_Info import FlyerRequest
+
+    request = FlyerRequest(**_campaign(server, scenario["products"], scenario["per_page"]))
+    response = build_flyers(request, progress=timer)
+    return {"pages": response.flyers_generated}
+
+
+def _bench_leaflet(server, scenario, timer: StageTimer) -> Dict[str, Any]:
+    from app.services.leaflet_generator import generate_flyer_pdf
+    from app.services.save_image import download_image_by_logo, download_image_by_product
+
+    campaign = _campaign(server, scenario["products"], scenario["per_page"])
+    timer.enter("downloading")
+    products = [
+        {**product, "product_path": download_image_by_product(product["name"], product["image_url"])}
+        for product in campaign["products"]
+    ]
+    request = {
+        **campaign,
+        "Why_this_campaign": campaign["why_this_campaign"],
+        "logo_path": download_image_by_logo(campaign["supermarket_name"], campaign["supermarket_logo_url"]),
+        "products": products,
+    }
+    timer.enter("generating")
+    result = generate_flyer_pdf(request, os.path.join(scenario["work_dir"], "leaflet.pdf"))
+    return {"pages": len(result["images"])}
+
+
+def _bench_generate_pdf(server, scenario, timer: StageTimer) -> Dict[str, Any]:
+    from app.routes.flyer import generate_pdf
+    from app.services.artifacts import FlyerArtifact
+    from benchmarks.fakes import render_image
+
+    # One page per products_per_page chunk, as the other targets would produce
+    timer.enter("rendering")
+    pages = -(-scenario["products"] // scenario["per_page"])
+    size = tuple(scenario["image_size"])
+    artifacts = [FlyerArtifact(render_image(size, n % 4, "PNG")) for n in range(pages)]
+    timer.enter("assembling")
+    generate_pdf(artifacts, os.path.join(scenario["work_dir"], "final_flyer.pdf"))
+    return {"pages": pages}
+
+
+_RUNNERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "generate_flyers": _bench_generate_flyers,
+    "leaflet": _bench_leaflet,
+    "generate_pdf": _bench_generate_pdf,
+}
+
+
+def run_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario in the current (fresh) process and return its record"""
+    work_dir = scenario["work_dir"]
+    os.environ.update({
+        "TEMP_DIR": os.path.join(work_dir, "temp"),
+        "OUTPUTS_DIR": os.path.join(work_dir, "outputs"),
+        "STORAGE_BACKEND": scenario["storage"],
+        "STORAGE_PUBLIC_BASE_URL": "http://127.0.0.1/outputs",
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "benchmark"),
+        "GEMINI_REQUESTS_PER_MINUTE": str(scenario["gemini_rpm"]),
+        **scenario["env"],
+    })
+    logging.basicConfig(level=logging.INFO if scenario["verbose"] else logging.WARNING)
+
+    from app.services.gemini_gateway import gemini
+    from app.services.storage import get_storage, set_storage
+    from benchmarks.fakes import FakeGeminiClient, ImageServer, MeteredStorage
+
+    client = FakeGeminiClient(
+        latency=scenario["latency"],
+        image_size=tuple(scenario["image_size"]),
+        rate_limit_ratio=scenario["rate_limit_ratio"],
+        retry_delay=scenario["retry_delay"],
+        seed=scenario["seed"],
+    )
+    gemini._client = client
+    storage = MeteredStorage(get_storage())
+    set_storage(storage)
+    server = ImageServer(
+        image_size=tuple(scenario["source_size"]),
+        distinct=scenario["distinct_images"] or scenario["products"],
+        latency=scenario["download_latency"],
+    ).start()
+
+    record = {key: scenario[key] for key in ("target", "products", "per_page", "storage", "latency", "rate_limit_ratio")}
+    baseline_rss = _peak_rss_mb()
+    timer = StageTimer()
+    started = time.monotonic()
+    try:
+        record.update(_RUNNERS[scenario["target"]](server, scenario, timer))
+        record["error"] = None
+    except Exception as e:
+        record["error"] = getattr(e, "detail", None) or str(e)
+    finally:
+        record["wall_seconds"] = round(time.monotonic() - started, 3)
+        record["stages"] = timer.finish()
+        server.stop()
+
+    gateway = gemini.stats()
+    record["peak_rss_mb"] = _peak_rss_mb()
+    record["workers_peak_rss_mb"] = _workers_peak_rss_mb()
+    record["baseline_rss_mb"] = baseline_rss
+    record["bytes"] = {
+        "downloaded": server.stats()["bytes"],
+        "gemini_in": client.stats()["bytes_in"],
+        "gemini_out": client.stats()["bytes_out"],
+        "stored": storage.stats()["bytes"],
+    }
+    record["gemini"] = {**client.stats(), "retries": gateway["retries"], "backoff_seconds": round(gateway["backoff_seconds"], 3)}
+    record["storage_stats"] = storage.stats()
+    return record
+
+
+def _child(scenario: Dict[str, Any], results):
+    results.put(run_scenario(scenario))
+
+
+def _run_isolated(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_child, args=(scenario, results))
+    process.start()
+    try:
+        return results.get(timeout=scenario["timeout"])
+    except Exception:
+        process.kill()
+        return {**{key: scenario[key] for key in ("target", "products", "per_page")}, "error": "timed out or crashed"}
+    finally:
+        process.join()
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _size(value: str) -> List[int]:
+    width, height = value.lower().split("x")
+    return [int(width), int(height)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma separated subset of {', '.join(TARGETS)}")
+    parser.add_argument("--products", type=_int_list, default=[1, 10, 50, 200], help="product counts to sweep")
+    parser.add_argument("--per-page", type=_int_list, default=[4, 8], help="products_per_page values to sweep")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake Gemini seconds per call")
+    parser.add_argument("--image-size", type=_size, default=[1024, 1280], help="generated page size, WxH")
+    parser.add_argument("--source-size", type=_size, default=[800, 800], help="served product image size, WxH")
+    parser.add_argument("--distinct-images", type=int, default=0, help="distinct product images (0 = one per product)")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="image server seconds per request")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="fraction of Gemini calls answered with 429")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="RetryInfo delay sent with injected 429s")
+    parser.add_argument("--gemini-rpm", type=float, default=100000, help="GEMINI_REQUESTS_PER_MINUTE for the run")
+    parser.add_argument("--storage", choices=("memory", "local"), default="memory")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting, repeatable")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds allowed per scenario")
+    parser.add_argument("--output", default=None, help="JSON file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    env = dict(item.split("=", 1) for item in args.env)
+
+    records = []
+    with tempfile.TemporaryDirectory(prefix="flyer-bench-") as root:
+        for target in targets:
+            for products in args.products:
+                for per_page in args.per_page:
+                    for run in range(args.repeat):
+                        work_dir = os.path.join(root, f"{target}-{products}-{per_page}-{run}")
+                        os.makedirs(work_dir)
+                        scenario = {
+                            "target": target,
+                            "products": products,
+                            "per_page": per_page,
+                            "work_dir": work_dir,
+                            "env": env,
+                            **{key: value for key, value in vars(args).items() if key not in ("targets", "products", "per_page", "env", "output", "repeat")},
+                        }
+                        record = _run_isolated(scenario)
+                        record["run"] = run
+                        records.append(record)
+                        print(
+                            f"{target:16} products={products:<4} per_page={per_page:<3} "
+                            f"wall={record.get('wall_seconds', '-')}s rss={record.get('peak_rss_mb', '-')}MB"
+                            + (f" error={record['error']}" if record.get("error") else ""),
+                            flush=True,
+                        )
+
+    output = args.output or os.path.join("benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "revision": _revision(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+            "results": records,
+        }, f, indent=2)
+    print(f"Wrote {len(records)} result(s) to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start check: time `import app.main` plus the lifespan startup in a fresh interpreter.
+
+    python -m benchmarks.startup --budget 0.8
+
+Prints a JSON report (import and startup seconds, slowest imports, heavy modules that
+were pulled in) and exits non-zero when the median time is over budget or a module
+that must stay lazy was imported, so it can gate CI and worker images.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Must not be imported while the app starts (loaded lazily on first use, or not at all)
+LAZY_MODULES = ("google.genai", "cloudinary", "torch", "transformers", "diffusers")
+
+_CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def startup():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        pass
+
+asyncio.run(startup())
+ready = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "startup_seconds": ready - started,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+# The child imports `app` from the repository root, wherever the check is started from
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        capture_output=True, text=True, env=env, check=True, cwd=_ROOT,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    # -X importtime writes one line per module: self and cumulative microseconds
+    cumulative = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            cumulative.append((int(match.group(2)) / 1e6, match.group(4)))
+    report["slowest_imports"] = [
+        {"module": name, "seconds": round(seconds, 3)}
+        for seconds, name in sorted(cumulative, reverse=True)[:15]
+    ]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "0.8")), help="max median seconds to a ready app")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    # No background warm-up: it would hit the network and is not on the ready path anyway
+    env = {**os.environ, "STARTUP_WARMUP": "false"}
+    runs = [measure(env) for _ in range(args.runs)]
+    modules = set(runs[-1]["modules"])
+    eager = [name for name in LAZY_MODULES if name in modules]
+    median = statistics.median(run["startup_seconds"] for run in runs)
+
+    report = {
+        "budget_seconds": args.budget,
+        "median_startup_seconds": round(median, 3),
+        "median_import_seconds": round(statistics.median(run["import_seconds"] for run in runs), 3),
+        "modules_loaded": len(modules),
+        "eager_heavy_modules": eager,
+        "slowest_imports": runs[-1]["slowest_imports"],
+    }
+    print(json.dumps(report, indent=2))
+
+    if median > args.budget or eager:
+        print(f"Startup check failed: {median:.3f}s (budget {args.budget}s), eager imports: {eager or 'none'}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
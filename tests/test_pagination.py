@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.pagination import FULL_GRID_SIZES, _fill, page_sizes
+
+
+@pytest.mark.parametrize("products, per_page, expected", [
+    (9, 4, [3, 3, 3]),
+    (14, 6, [6, 4, 4]),
+    (26, 8, [8, 6, 6, 6]),
+])
+def test_balanced_documented_splits(products, per_page, expected):
+    assert page_sizes(products, per_page) == expected
+
+
+@pytest.mark.parametrize("products, per_page, expected", [
+    (9, 4, [4, 4, 1]),
+    (14, 6, [6, 6, 2]),
+    (26, 8, [8, 8, 8, 2]),
+    (8, 4, [4, 4]),
+])
+def test_fixed_keeps_the_old_split(products, per_page, expected):
+    assert page_sizes(products, per_page, strategy="fixed") == expected
+
+
+@pytest.mark.parametrize("per_page", [1, 2, 3, 4, 5, 6, 8, 9, 12])
+def test_balanced_preserves_total_and_page_count(per_page):
+    for products in range(1, 61):
+        sizes = page_sizes(products, per_page)
+        fixed = page_sizes(products, per_page, strategy="fixed")
+        assert sum(sizes) == products
+        assert len(sizes) == len(fixed)
+        assert max(sizes) <= per_page
+        assert sizes == sorted(sizes, reverse=True)
+
+
+def test_empty_and_degenerate_inputs():
+    assert page_sizes(0, 4) == []
+    assert page_sizes(3, 0) == [1, 1, 1]
+
+
+def test_fill():
+    assert _fill(14, 3, [4, 6]) == [6, 4, 4]
+    assert _fill(13, 3, [4, 6]) is None
+    assert all(size in FULL_GRID_SIZES for size in _fill(26, 4, [6, 8]))
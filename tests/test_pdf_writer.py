@@ -0,0 +1,69 @@
+import logging
+from io import BytesIO
+
+import pypdf
+import pytest
+from PIL import Image
+
+from app.services.image_workers import image_workers
+from app.services.pdf_writer import StreamingPdfWriter
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _stop_workers():
+    yield
+    image_workers.shutdown(wait=True)
+
+
+def _encoded(mode: str, size, colour, fmt: str) -> bytes:
+    buffer = BytesIO()
+    Image.new(mode, size, colour).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _read(data: bytes, caplog):
+    # Strict mode still repairs a wrong xref offset, only logging a warning: treat those as failures too
+    with caplog.at_level(logging.WARNING, logger="pypdf"):
+        reader = pypdf.PdfReader(BytesIO(data), strict=True)
+        for page in reader.pages:
+            page["/Resources"]["/XObject"]["/Im0"].get_object()
+    assert not [record for record in caplog.records if record.name.startswith("pypdf")]
+    return reader
+
+
+def test_pages_parse_in_strict_mode(caplog):
+    pages = [
+        (_encoded("RGB", (120, 80), (200, 30, 30), "JPEG"), "/DeviceRGB", (120, 80)),
+        (_encoded("L", (60, 90), 128, "JPEG"), "/DeviceGray", (60, 90)),
+        (Image.new("L", (40, 40), 200), "/DeviceGray", (40, 40)),
+        (_encoded("RGBA", (100, 50), (0, 120, 255, 128), "PNG"), "/DeviceRGB", (100, 50)),
+        (Image.new("RGBA", (30, 70), (10, 200, 10, 255)), "/DeviceRGB", (30, 70)),
+    ]
+    output = BytesIO()
+    with StreamingPdfWriter(output, dpi=72) as pdf:
+        for page, _, _ in pages:
+            pdf.add_page(page)
+    assert pdf.page_count == len(pages)
+
+    reader = _read(output.getvalue(), caplog)
+    assert len(reader.pages) == len(pages)
+    for page, (_, colour_space, size) in zip(reader.pages, pages):
+        # dpi=72 makes one pixel one point
+        assert (float(page.mediabox.width), float(page.mediabox.height)) == size
+        image = page["/Resources"]["/XObject"]["/Im0"].get_object()
+        assert image["/Filter"] == "/DCTDecode"
+        assert image["/ColorSpace"] == colour_space
+        assert (image["/Width"], image["/Height"]) == size
+        decoded = page.images[0].image
+        assert decoded.size == size
+        assert decoded.mode == ("L" if colour_space == "/DeviceGray" else "RGB")
+
+
+def test_jpeg_pages_are_embedded_unchanged(caplog):
+    jpeg = _encoded("RGB", (64, 48), (1, 2, 3), "JPEG")
+    output = BytesIO()
+    with StreamingPdfWriter(output) as pdf:
+        pdf.add_page(jpeg)
+    reader = _read(output.getvalue(), caplog)
+    image = reader.pages[0]["/Resources"]["/XObject"]["/Im0"].get_object()
+    assert image.get_data() == jpeg
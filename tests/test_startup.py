@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from benchmarks import startup
+
+# Same default as `python -m benchmarks.startup`; slower CI runners can raise it
+BUDGET_SECONDS = os.getenv("STARTUP_BUDGET_SECONDS", "0.8")
+
+
+def test_startup_within_budget_and_lazy():
+    # main() exits non-zero when the median cold start is over budget or a lazy module was imported
+    try:
+        startup.main(["--budget", BUDGET_SECONDS, "--runs", "3"])
+    except SystemExit as e:
+        pytest.fail(f"Startup check failed (exit status {e.code}), see the report in the captured output")